@@ -21,12 +21,44 @@ import sys
 import os
 import subprocess
 import signal
-import RPi.GPIO as GPIO
-import smbus
 import logging
-import gphoto2 as gp
 import datetime
 from random import randint
+import fotopulse
+import fotoendstop
+import fotoposition
+import fotoworker
+import fototiming
+import fotoplan
+import fotocache
+import fotostop
+import fotomotor
+import fototrack
+import fotoaim
+import fotocam
+import fotosettle
+
+#-----------------------------------------------------------------------------
+# hardware or simulation (FOTO_SIM=1 or FOTO_SIM=<directory>, see fotosim.py)
+
+sim = os.environ.get('FOTO_SIM', '') != ''
+if sim:
+    import fotosim
+    rig = fotosim.Rig()
+    GPIO = rig.gpio
+    smbus = rig.smbus
+    gp = rig.gp
+    subprocess = rig.subprocess
+    time = rig.clock
+else:
+    import RPi.GPIO as GPIO
+    import smbus
+    import gphoto2 as gp
+
+try:
+    raw_input
+except NameError:
+    raw_input = input
 
 #-----------------------------------------------------------------------------
 # Aktuelle Hardware-Konfiguration
@@ -40,6 +72,103 @@ from random import randint
 
 I2C_ADDR = 0x20
 
+# guaranteed endstop stop distance in steps (max. steps between two checks)
+ESTEP = 16
+
+# gpio bcm number of the PCF8574 INT line, None means sampling every ESTEP steps
+ESTOP_INT = None
+
+# MX home position is HOME steps left of the endstop, position 0
+# the endstop is only expected within EMARGIN steps of its known place
+HOME = 400
+EMARGIN = 200
+
+# homing: speed of the fast and slow approach, backoff between them
+HOMEFAST = 1
+HOMESLOW = 8
+HOMEBACK = 200
+
+# position state file
+POSFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "foto.pos")
+
+# step timing statistics, one line per move
+STEPLOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fotosteps.log")
+
+# compiled step plans of the programs (see fotocache.py)
+CACHEDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fotocache")
+
+# star tracking, one line per minute
+TRACKLOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fototrack.log")
+
+# calibrated settle constants (key k, see fotosettle.py)
+SETTLEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fotosettle.json")
+
+# picture base directory
+IMGDIR = "/media/pi/STICK/images/"
+
+# a simulation keeps all its files in its own directory
+if sim:
+    simdir = fotosim.workdir(os.environ['FOTO_SIM'])
+    POSFILE = os.path.join(simdir, "foto.pos")
+    STEPLOG = os.path.join(simdir, "fotosteps.log")
+    CACHEDIR = os.path.join(simdir, "fotocache")
+    TRACKLOG = os.path.join(simdir, "fototrack.log")
+    SETTLEFILE = os.path.join(simdir, "fotosettle.json")
+    IMGDIR = os.path.join(simdir, "images") + "/"
+
+# steps per waveform without endstop check (cancel granularity)
+CSTEP = 400
+
+# step pulse width in microseconds
+PULSE_US = 50
+
+# max. length of a waveform packet in milliseconds, bounds the emergency stop reaction
+# (the backend plays one packet while the next is queued)
+PACKET_MS = 25
+
+# gpio bcm number of an emergency stop button (to GND), None means none
+ESTOP_PIN = None
+
+# settle time before a shot in seconds when no move of the program precedes it,
+# after a move the dwell comes from the move (fotosettle.py)
+SETTLE = 2
+
+# pause after a shot before the next move (the camera must be done with the frame)
+AFTERSHOT = 2
+
+# settle calibration (key k): test moves (mot, dir, numsteps), back to the start at the end
+SETTLE_TESTS = [(0, 1, 400), (0, 1, 12300), (0, 0, 12700), (1, 0, 160), (1, 0, 800), (1, 1, 960)]
+
+# shots waiting for their download in the background, the next shot waits when it is full
+DL_QUEUE = 4
+
+# frames per shot with FOTO_CAM=event, released at camera speed (burst, or a bracket set on the camera)
+BURST = 1
+
+# FOTO_CAM=event: longest exposure per frame in seconds (shutter time plus camera delay),
+# the slider waits for the camera's end of exposure, at most this long after the last release
+EXPOSURE = 1.0
+
+# star tracking on MY (key f): rate in degrees per second, duration in seconds,
+# exposure set on the camera in seconds (None = no shots), MY direction
+TRACK_RATE = fototrack.SIDEREAL
+TRACK_SECS = 3600
+TRACK_EXPOSURE = 20.0
+TRACK_DIR = 1
+
+# subject tracking hyperlapse (key z): subject AIM_DIST mm in front of the rail,
+# AIM_OFFSET mm along the rail from the right end, AIM_SHOTS intervals with a shot at each stop
+AIM_DIST = 1500.0
+AIM_OFFSET = 309.0
+AIM_SHOTS = 12
+
+# duration of the movie moves P5/P6 in seconds, constant speed between the ramps
+# (None = as fast as the axes allow)
+VIDEO_SECS = None
+
+# acceleration profile, trap or scurve (limits per axis see fotoprofile.py)
+prof = os.environ.get('FOTO_PROFILE', 'trap')
+
 # pin defs for x,y,z steppers
 # control pins
 # gpio bcm numbers 5,6,12,13 means board pins 29,31,32,33 (violett,grau,braun,schwarz)
@@ -74,210 +203,201 @@ pc = 0
 sr = "00000000"
 # camera enable flag
 cfl = False
+# camera session for all shots (FOTO_CAM=pershot: init/exit per shot as before)
+# FOTO_CAM=card: shots stay on the memory card, bulk download at the end of each program
+# capture target memory card whenever a frame can wait for its download (card, background, event)
+cammode = os.environ.get('FOTO_CAM', '')
+cam = fotocam.CameraSession(gp, time.time, cammode != 'pershot', cammode in ('', 'card', 'event'))
+# settle model, per axis constants from SETTLEFILE if calibrated
+settling = fotosettle.Settle(SETTLEFILE)
+# download and save in the background while the slider moves on (FOTO_CAM=sync/pershot: in the shot)
+# FOTO_CAM=event: trigger_capture, the files come as camera events and are loaded in the background
+camdl = None
+camev = None
+if cammode in ('', 'event'):
+    camdl = fotocam.Downloader(cam, DL_QUEUE)
+if cammode == 'event':
+    camev = fotocam.EventWatcher(cam, camdl, not sim)
+    if sim:
+        # im Simulator fragt die virtuelle Uhr die Ereignisse ab
+        rig.clock.hooks.append(camev.poll)
+# homing trigger offsets of this session
+homelog = []
+# motion worker (X mode only)
+worker = None
 
 #-----------------------------------------------------------------------------
 # the stepper routine
 # stepper(mot,dir,numsteps,force)
 # motors (mot) 0:x 1:y 2:z 3:a , directions (dir) 0:left 1:right
 # numsteps - number of steps
-# speed - 1-voll 2-halb 3-drittel etc.
+# speed - 1-voll 2-halb 3-drittel etc. (divides the axis vmax)
 # force = 0/1 - do/not look at right stop contact
+# every move accelerates/cruises/decelerates within the axis limits
+# returns the number of steps done (less than numsteps when the endstop closed)
 
 def stepper(mot, dir, numsteps, speed, force):
-    global xa, ya, za, aa, xd, yd, zd, ad, en
-
-    if mot == 0:
-        #print "Fahre X-Motor."
-        cpin = xa
-    elif mot == 1:
-        #print "Fahre Y-Motor."
-        cpin = ya
-    elif mot == 2:
-        #print "Fahre Z-Motor."
-        cpin = za
-    elif mot == 3:
-        #print "Fahre A-Motor."
-        cpin = aa
-
-    if cpin == xa:
-        if dir == 0:
-            #print "X-Richtung Links."
-            GPIO.output(xd, False)
-        elif dir == 1:
-            #print "X-Richtung Rechts."
-            GPIO.output(xd, True)
-    elif cpin == ya:
-        if dir == 0:
-            #print "Y-Richtung Links."
-            GPIO.output(yd, False)
-        elif dir == 1:
-            #print "Y-Richtung Rechts."
-            GPIO.output(yd, True)
-    elif cpin == za:
-        if dir == 0:
-            #print "Z-Richtung Rechts."
-            GPIO.output(zd, False)
-        elif dir == 1:
-            #print "Z-Richtung Links."
-            GPIO.output(zd, True)
-    elif cpin == aa:
-        if dir == 0:
-            #print "A-Richtung Links."
-            GPIO.output(ad, False)
-        elif dir == 1:
-            #print "A-Richtung Rechts."
-            GPIO.output(ad, True)
-
-    GPIO.output(en, False)
-
-    for i in range(numsteps):
-
-      if force == 0:
-        pins = i2c.read_byte(I2C_ADDR)
-        if (pins & 0x04)/4 == 0 :
-            GPIO.output(cpin, True)
-            time.sleep(0.0004)
-            time.sleep(0.0001*speed)
-            GPIO.output(cpin, False)
-            time.sleep(0.0001*speed)
-
-      if force == 1:
-            GPIO.output(cpin, True)
-            time.sleep(0.0001*speed)
-            GPIO.output(cpin, False)
-            time.sleep(0.0001*speed)
-
-    GPIO.output(en, True)
+    return stepn([(mot, dir, numsteps)], speed, force)
 
 #-----------------------------------------------------------------------------
-# the stepper2 routine, control two motors same time
-# stepper2(mot1,dir1,numsteps1,mot2,dir2,numsteps2,speed)
-# motors (mot) 0:x 1:y 2:z 3:a , directions (dir) 0:left 1:right
-# numsteps - number of steps
+# the stepn routine, control any subset of the motors same time
+# stepn(moves, speed, force, name, stopdist)
+# moves - list of (mot, dir, numsteps), motors (mot) 0:x 1:y 2:z 3:a , directions (dir) 0:left 1:right
 # speed - 1-voll 2-halb 3-drittel etc.
+# force = 0/1 - do/not look at right stop contact
+# name - program name, the compiled move is cached (see fotocache.py)
+# stopdist - endstop stop distance for this move (None = ESTEP)
+# returns the number of ticks done
 
-# Es wird das Verhaeltnis numsteps1 / numsteps2 berechnet
-# mot2 wird nur soviel gesteppt, dass auf den Fahrweg mot1 genau der Fahrweg mot2 gemacht wird
-# numsteps2 muss dabei kleiner oder gleich numsteps1 sein 
-# mot1 == mot2 ist verboten
+# Die Schritte aller Motoren werden per DDA (Bresenham) gleichmaessig auf die
+# Schritte des Motors mit dem laengsten Weg verteilt, jeder Motor kommt exakt an.
 
-def stepper2(mot1, dir1, numsteps1, mot2, dir2, numsteps2, speed):
-  global xa, ya, za, aa, xd, yd, zd, ad, en
+def stepn(moves, speed, force, name=None, stopdist=None, secs=None):
+    counts = {}
+    for mot, dir, numsteps in moves:
+        if mot in counts:
+            print("Verbotene Motor-Angabe (Motor mehrfach angegeben).")
+            return 0
+        counts[mot] = numsteps
 
-  if mot1 == mot2:
-    print("Verbotene Motor-Angabe (Beide Motoren gleich).")
-  else:
-   if numsteps2 > numsteps1:
-     print("Verbotene Stepper-Angabe (numsteps2 darf keinen groesseren Wert als numsteps1 haben).")
-   else:
+    return move([(moves, speed)], force, name, stopdist=stopdist, secs=secs)
+
+#-----------------------------------------------------------------------------
+# hand a run to the motion engine (see fotomotor.py), here or in the motion process
+# segs - list of (moves, speed), blended when more than one
+# labels - display updates (tick, str1, str2) while passing
+# secs - video move of exactly secs seconds (one segment)
+
+def move(segs, force, name=None, labels=(), stopdist=None, secs=None):
+    try:
+        return motion.move(segs, force, name, labels, clupd, check, stopdist, secs=secs)
+    finally:
+        if sim and motionproc:
+            rig.mirror(motion.steps, motion.last_us)
+
+#-----------------------------------------------------------------------------
+# single steps at the caller's time (tracking), drivers stay enabled while hold
+
+def steps(mot, dir, n=1, hold=True):
+    try:
+        motion.step(mot, dir, n, hold)
+    finally:
+        if sim and motionproc:
+            rig.mirror(motion.steps, motion.last_us)
+
+#-----------------------------------------------------------------------------
+# subject tracking: MX steps a .. b-1 of a move of nx steps, MY keeps the subject centred
 
-    if mot1 == 0:
-        #print "Fahre X-Motor."
-        cpin1 = xa
-    elif mot1 == 1:
-        #print "Fahre Y-Motor."
-        cpin1 = ya
-    elif mot1 == 2:
-        #print "Fahre Z-Motor."
-        cpin1 = za
-    elif mot1 == 3:
-        #print "Fahre A-Motor."
-        cpin1 = aa
-
-    if mot2 == 0:
-        #print "Fahre X-Motor."
-        cpin2 = xa
-    elif mot2 == 1:
-        #print "Fahre Y-Motor."
-        cpin2 = ya
-    elif mot2 == 2:
-        #print "Fahre Z-Motor."
-        cpin2 = za
-    elif mot2 == 3:
-        #print "Fahre A-Motor."
-        cpin2 = aa
-
-    if cpin1 == xa:
-        if dir1 == 0:
-            #print "X-Richtung Links."
-            GPIO.output(xd, False)
-        elif dir1 == 1:
-            #print "X-Richtung Rechts."
-            GPIO.output(xd, True)
-    elif cpin1 == ya:
-        if dir1 == 0:
-            #print "Y-Richtung Links."
-            GPIO.output(yd, False)
-        elif dir1 == 1:
-            #print "Y-Richtung Rechts."
-            GPIO.output(yd, True)
-    elif cpin1 == za:
-        if dir1 == 0:
-            #print "Z-Richtung Rechts."
-            GPIO.output(zd, False)
-        elif dir1 == 1:
-            #print "Z-Richtung Links."
-            GPIO.output(zd, True)
-    elif cpin1 == aa:
-        if dir1 == 0:
-            #print "A-Richtung Links."
-            GPIO.output(ad, False)
-        elif dir1 == 1:
-            #print "A-Richtung Rechts."
-            GPIO.output(ad, True)
-
-    if cpin2 == xa:
-        if dir2 == 0:
-            #print "X-Richtung Links."
-            GPIO.output(xd, False)
-        elif dir2 == 1:
-            #print "X-Richtung Rechts."
-            GPIO.output(xd, True)
-    elif cpin2 == ya:
-        if dir2 == 0:
-            #print "Y-Richtung Links."
-            GPIO.output(yd, False)
-        elif dir2 == 1:
-            #print "Y-Richtung Rechts."
-            GPIO.output(yd, True)
-    elif cpin2 == za:
-        if dir2 == 0:
-            #print "Z-Richtung Rechts."
-            GPIO.output(zd, False)
-        elif dir2 == 1:
-            #print "Z-Richtung Links."
-            GPIO.output(zd, True)
-    elif cpin2 == aa:
-        if dir2 == 0:
-            #print "A-Richtung Links."
-            GPIO.output(ad, False)
-        elif dir2 == 1:
-            #print "A-Richtung Rechts."
-            GPIO.output(ad, True)
-
-    GPIO.output(en, False)
-
-    dsteps = numsteps1 / numsteps2
-    dstepc = 1
-
-    for i in range(numsteps1):
-
-        pins = i2c.read_byte(I2C_ADDR)
-        if (pins & 0x04)/4 == 0 :
-
-            dstepc = dstepc + 1
-            GPIO.output(cpin1, True)
-            if dstepc > dsteps :
-                GPIO.output(cpin2, True)
-            time.sleep(0.0004)
-            time.sleep(0.0001*speed)
-            GPIO.output(cpin1, False)
-            if dstepc > dsteps :
-                GPIO.output(cpin2, False)
-                dstepc = 1
-            time.sleep(0.0001*speed)
-
-    GPIO.output(en, True)
+def aim(nx, dirx, dist, offset, a, b):
+    try:
+        return motion.aim(nx, dirx, dist, offset, a, b, 0, 1, check)
+    finally:
+        if sim and motionproc:
+            rig.mirror(motion.steps, motion.last_us)
+
+#-----------------------------------------------------------------------------
+# run a program through the planner (see fotoplan.py)
+# pr - program number for the picture names, seq - program items
+# moves without a stop between them are blended, every shot waits for the swing of the last move
+# the compiled runs are cached per program, equal runs share one plan (see fotocache.py)
+
+def program(pr, seq):
+    last = None
+    for blk in fotoplan.plan(seq):
+        if blk[0] == 'run':
+            run = blk[1]
+            segs = [(moves, speed) for moves, (c, d, speed) in zip(run.moves, run.segs)]
+            move(segs, run.force, "P" + pr, run.labels)
+            last = (run.segs[-1][0], run.segs[-1][2], time.time())
+        elif blk[0] == 'show':
+            clupd(blk[1], blk[2])
+        elif blk[0] == 'shot':
+            settle(last)
+            shot(pr, blk[1])
+        elif blk[0] == 'dwell':
+            pause(blk[1])
+
+#-----------------------------------------------------------------------------
+# wait until the swing of the last move has died out, the time since the stop counts
+# last - (counts, speed, time of the stop) of the segment that stopped, None = SETTLE seconds
+
+def settle(last):
+    if last is None:
+        pause(SETTLE)
+        return
+    counts, speed, t = last
+    pause(max(0.0, settling.after(counts, speed) - (time.time() - t)))
+
+#-----------------------------------------------------------------------------
+# move an axis to an absolute position
+# goto(mot,target,speed)
+
+def goto(mot, target, speed):
+    d = target - position.pos[mot]
+    if d > 0:
+        stepper(mot, 1, d, speed, 0)
+    elif d < 0:
+        stepper(mot, 0, -d, speed, 0)
+
+#-----------------------------------------------------------------------------
+# Nullung, only when the X position is unknown or drifted too far
+# nullung(always) - always = True forces the endstop run
+
+def nullung(always):
+    if always or position.need_home(0):
+        pause(2)
+        homing()
+    else:
+        clupd(">0", ">0")
+        goto(0, 0, 1)  #direkt auf Ausgangsposition
+    clupd("0", "0")
+
+#-----------------------------------------------------------------------------
+# the homing routine, two phases
+# fast approach with acceleration until the endstop closes, back off HOMEBACK steps,
+# slow approach with a check every step, then HOME steps to the home position
+# reports duration, drift against the tracked position and the trigger spread
+
+def homing():
+    global homelog
+
+    t = time.time()
+    p0 = None
+    if position.known[0]:
+        p0 = position.pos[0]
+
+    clupd(">", ">")
+    d1 = stepper(0, 0, 27000, HOMEFAST, 0)  #Nullung schnell
+    if d1 >= 27000:
+        print("Endstop nicht gefunden.")
+        return
+    clupd("<", "<")
+    pause(0.2)
+    stepper(0, 1, HOMEBACK, HOMESLOW, 1)  #zurueck
+
+    clupd(">", ">")
+    d2 = stepn([(0, 0, 2 * HOMEBACK)], HOMESLOW, 0, stopdist=2)  #Nullung langsam
+    if d2 >= 2 * HOMEBACK:
+        print("Endstop nicht gefunden.")
+        return
+    clupd("<", "<")
+    stepper(0, 1, HOME, 1, 1)  #Ausgangsposition
+
+    # Abweichung langsamer zu schnellem Ausloesepunkt in Schritten
+    homelog.append(HOMEBACK - d2)
+    print("Nullung in %.1f s" % (time.time() - t))
+    if p0 is not None:
+        print("Drift gegen Position: %d Schritte" % (p0 - d1 + HOME))
+    print("Ausloesepunkt: %d Schritte zur schnellen Anfahrt, Streuung %d Schritte (%d Laeufe)" %
+          (homelog[-1], max(homelog) - min(homelog), len(homelog)))
+
+#-----------------------------------------------------------------------------
+# the stepper2 routine, control two motors same time
+# stepper2(mot1,dir1,numsteps1,mot2,dir2,numsteps2,speed)
+# kept for the programs, runs stepn with endstop check
+
+def stepper2(mot1, dir1, numsteps1, mot2, dir2, numsteps2, speed):
+    stepn([(mot1, dir1, numsteps1), (mot2, dir2, numsteps2)], speed, 0)
 
 #-----------------------------------------------------------------------------
 # reboot
@@ -286,13 +406,11 @@ def press_r(event):
     clicked1()
 
 def clicked1():
+    clicked21()
     print("Reboot...")
     print("----------------------------------------------------------")
     global ge
-    if(ge):
-       txt.insert(END,"Reboot...\n")
-       txt.see(END)
-       frm.update()
+    tout("Reboot...\n")
     countr(5)
 
 def countr(count):
@@ -302,10 +420,12 @@ def countr(count):
            btn1["text"] = count
            frm.after(1000, countr, count -1)
        elif count == 0:
+           camclose()
            GPIO.cleanup()
            subprocess.call(["sudo","reboot"])
     else:
        time.sleep(count)
+       camclose()
        GPIO.cleanup()
        subprocess.call(["sudo","reboot"])
 
@@ -316,13 +436,11 @@ def press_s(event):
     clicked2()
 
 def clicked2():
+    clicked21()
     print("Fahre Fotoslider herunter...")
     print("----------------------------------------------------------")
     global ge
-    if(ge):
-       txt.insert(END,"Fahre Fotoslider herunter...\n")
-       txt.see(END)
-       frm.update()
+    tout("Fahre Fotoslider herunter...\n")
     counts(5)
 
 def counts(count):
@@ -332,10 +450,12 @@ def counts(count):
            btn2["text"] = count
            frm.after(1000, counts, count -1)
        elif count == 0:
+           camclose()
            GPIO.cleanup()
            subprocess.call(["sudo","shutdown","now"])
     else:
        time.sleep(count)
+       camclose()
        GPIO.cleanup()
        subprocess.call(["sudo","shutdown","now"])
 
@@ -346,13 +466,11 @@ def press_x(event):
     clicked3()
 
 def clicked3():
+    clicked21()
     print("Beende Programm...")
     print("----------------------------------------------------------")
     global ge
-    if(ge):
-       txt.insert(END,"Beende Programm...\n")
-       txt.see(END)
-       frm.update()
+    tout("Beende Programm...\n")
     countb(5)
 
 def countb(count):
@@ -362,10 +480,12 @@ def countb(count):
            btn3["text"] = count
            frm.after(1000, countb, count -1)
        elif count == 0:
+           camclose()
            GPIO.cleanup()
            subprocess.call(["sudo","killall","python"])
     else:
        #time.sleep(count)
+       camclose()
        GPIO.cleanup()
        subprocess.call(["sudo","killall","python"])
 
@@ -373,15 +493,12 @@ def countb(count):
 # stepper test
 
 def press_t(event):
-    clicked4()
+    run(clicked4)
 
 def clicked4():
     global ge
     print("Stepper-Test...")
-    if(ge):
-       txt.insert(END,"Stepper-Test...\n")
-       txt.see(END)
-       frm.update()
+    tout("Stepper-Test...\n")
 
     # Motortest - eine Umdrehung aller Motoren
 
@@ -395,45 +512,40 @@ def clicked4():
     clupd("st", "st")
 
     #MX
-    time.sleep(10)
+    pause(10)
     stepper(0, 0, 1600, 1, 0)  #mx rechts schiebend, links drehend
-    time.sleep(2)
+    pause(2)
     stepper(0, 1, 1600, 1, 0)  #mx links schiebend, rechts drehend
     #MY
-    time.sleep(2)
+    pause(2)
     stepper(1, 0, 3200, 1, 0)  #my links drehend
-    time.sleep(2)
+    pause(2)
     stepper(1, 1, 3200, 1, 0)  #my rechts drehend
     #MZ
-    time.sleep(2)
+    pause(2)
     stepper(2, 0, 400, 1, 0)   #mz rechts drehend (Richtung zum Rest invertiert)
-    time.sleep(2)
+    pause(2)
     stepper(2, 1, 400, 1, 0)   #mz linkss drehend (Richtung zum Rest invertiert)
     #MA
-    time.sleep(2)
+    pause(2)
     stepper(3, 0, 200, 1, 0)   #ma links drehend
-    time.sleep(2)
+    pause(2)
     stepper(3, 1, 200, 1, 0)   #ma rechtss drehend
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # input test
 
 def press_i(event):
-    clicked14()
+    run(clicked14)
 
 def clicked14():
     global ge
     print("Input-Test...")
-    if(ge):
-       txt.insert(END,"Input-Test...\n")
-       txt.see(END)
-       frm.update()
+    tout("Input-Test...\n")
 
     clupd("it", "it")
 
@@ -447,59 +559,40 @@ def clicked14():
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Nullung
 
 def press_n(event):
-    clicked11()
+    run(clicked11)
 
 def clicked11():
     global ge
     print("Nullung...")
-    if(ge):
-       txt.insert(END,"Nullung...\n")
-       txt.see(END)
-       frm.update()
+    tout("Nullung...\n")
 
     clupd("n", "n")
 
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-
-    stepper(0, 1, 400, 1, 1)  #Ausgangsposition
-    clupd("0", "0")
+    nullung(True)
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Volle Fahrt nach links ohne Nullung
 
 def press_a(event):
-    clicked5()
+    run(clicked5)
 
 def clicked5():
     global ge
     print("Fahrt nach links ohne Nullung...")
-    if(ge):
-       txt.insert(END,"Fahrt nach links ohne Nullung...\n")
-       txt.see(END)
-       frm.update()
+    tout("Fahrt nach links ohne Nullung...\n")
 
     clupd("<!", "<!")
-    time.sleep(2)
+    pause(2)
     #MX
     #Es werden 24600 Achtelschritte benoetigt
     stepper(0, 1, 24600, 1, 0)  #mx (mot=0) links schiebend, links drehend (dir=1)
@@ -507,161 +600,116 @@ def clicked5():
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Volle Fahrt nach links mit Nullung
 
 def press_1(event):
-    clicked12()
+    run(clicked12)
 
 def clicked12():
     global ge
     print("Fahrt nach links mit Nullung...")
-    if(ge):
-       txt.insert(END,"Fahrt nach links mit Nullung...\n")
-       txt.see(END)
-       frm.update()
+    tout("Fahrt nach links mit Nullung...\n")
 
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-    stepper(0, 1, 400, 1, 1)  #mx links schiebend bis rechte Ausgangs/Null-Position, Endstop ignorieren
-    clupd("0", "0")
-    time.sleep(5)
+    nullung(False)
+    pause(5)
     clupd("<<", "<<")
     stepper(0, 1, 24600, 1, 0)  #mx links schiebend wie gewuenscht
     clupd(".", ".")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Volle Fahrt nach rechts ohne Nullung
 
 def press_b(event):
-    clicked6()
+    run(clicked6)
 
 def clicked6():
     global ge
     print("Fahrt nach rechts ohne Nullung...")
-    if(ge):
-       txt.insert(END,"Fahrt nach rechts ohne Nullung...\n")
-       txt.see(END)
-       frm.update()
+    tout("Fahrt nach rechts ohne Nullung...\n")
 
     #MX
     #Es werden 24600 Achtelschritte benoetigt
     clupd("!>", "!>")
-    time.sleep(2)
+    pause(2)
     stepper(0, 0, 24600, 1, 0)  #mx (mot=0) rechts schiebend, rechts drehend (dir=0)
     clupd(".", ".")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Volle Fahrt nach rechts mit Nullung
 
 def press_2(event):
-    clicked13()
+    run(clicked13)
 
 def clicked13():
     global ge
     print("Fahrt nach rechts mit Nullung...")
-    if(ge):
-       txt.insert(END,"Fahrt nach rechts mit Nullung...\n")
-       txt.see(END)
-       frm.update()
+    tout("Fahrt nach rechts mit Nullung...\n")
 
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-    stepper(0, 1, 400, 1, 1)  #mx links schiebend bis rechte Ausgangs/Null-Position, Endstop ignorieren
-    clupd("0", "0")
-    time.sleep(2)
+    nullung(False)
+    pause(2)
     clupd("<<", "<<")
     stepper(0, 1, 24600, 1, 0)  #mx nach links schieben bis auf linke Ausgangsposition
-    time.sleep(5)
+    pause(5)
     clupd(">>", ">>")
     stepper(0, 0, 24600, 1, 0)  #mx nach rechts schieben wie gewuenscht
     clupd(".", ".")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Linksschwenk 180 Grad
 
 def press_3(event):
-    clicked7()
+    run(clicked7)
 
 def clicked7():
     global ge
     print("Linksschwenk 180 Grad...")
-    if(ge):
-       txt.insert(END,"Linksschwenk 180 Grad...\n")
-       txt.see(END)
-       frm.update()
+    tout("Linksschwenk 180 Grad...\n")
 
     clupd("o", "o")
-    time.sleep(2)
+    pause(2)
     #MY
     #Es werden 1600 1/16-Schritte benoetigt
     stepper(1, 1, 1600, 4, 0)  #my (mot=1) links drehend (dir=1)
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Rechtsschwenk 180 Grad
 
 def press_4(event):
-    clicked8()
+    run(clicked8)
 
 def clicked8():
     global ge
     print("Rechtsschwenk 180 Grad...")
-    if(ge):
-       txt.insert(END,"Rechtsschwenk 180 Grad...\n")
-       txt.see(END)
-       frm.update()
+    tout("Rechtsschwenk 180 Grad...\n")
 
     clupd("o", "o")
-    time.sleep(2)
+    pause(2)
     #MY
     #Es werden 1600 1/16-schritte benoetigt
     stepper(1, 0, 1600, 4, 0)  #my (mot=1) rechtss drehend (dir=0)
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Programm 5
@@ -669,37 +717,25 @@ def clicked8():
 # Movie-Programm keine Shots
 
 def press_5(event):
-    clicked9()
+    run(clicked9)
 
 def clicked9():
     global ge
     print("Programm 5...")
-    if(ge):
-       txt.insert(END,"Programm 5...\n")
-       txt.see(END)
-       frm.update()
+    tout("Programm 5...\n")
 
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-    stepper(0, 1, 400, 1, 1)  #Ausgangsposition
-    clupd("0", "0")
-    time.sleep(5)
+    nullung(False)
+    pause(5)
     clupd("<o", "<o")
     #MX Fahrt nach links = (0,1)
     #MY Es werden 1600 1/16-Schritte fuer 180 Grad benoetigt, 800 fuer 90 Grad
-    stepper2(0, 1, 24600,  1, 1, 800,  1) #my (mot=1) links drehend (dir=1)
+    stepn([(0, 1, 24600), (1, 1, 800)], 1, 0, "P5", secs=VIDEO_SECS) #my (mot=1) links drehend (dir=1)
     #12300, 600 halbe Schiene Fahrt nach linkss, 90 Grad Drehung nach links
     clupd("1", "618")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Programm 6
@@ -707,41 +743,29 @@ def clicked9():
 # Movie-Programm keine Shots
 
 def press_6(event):
-    clicked10()
+    run(clicked10)
 
 def clicked10():
     global ge
     print("Programm 6...")
-    if(ge):
-       txt.insert(END,"Programm 6...\n")
-       txt.see(END)
-       frm.update()
+    tout("Programm 6...\n")
 
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-    stepper(0, 1, 400, 1, 1)  #Ausgangsposition
-    clupd("0", "0")
-    time.sleep(2)
+    nullung(False)
+    pause(2)
     clupd("<<", "<<")
     stepper(0, 1, 24600, 1, 0)  #nach links durchfahren
     clupd("1", "618")
-    time.sleep(5)
+    pause(5)
     clupd("o>", "o>")
     #MX Fahrt nach rechts = (0,0)
     #MY Es werden 1600 1/16-Schritte fuer 180 Grad benoetigt, 800 fuer 90 Grad
-    stepper2(0, 0, 24600,   1, 0, 800,  1)  #my (mot=1) rechts drehend (dir=0)
+    stepn([(0, 0, 24600), (1, 0, 800)], 1, 0, "P6", secs=VIDEO_SECS)  #my (mot=1) rechts drehend (dir=0)
     #12300, 600 halbe Schiene Fahrt nach rechts, 90 Grad Drehung nach rechts
     clupd("2", "0")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Programm 7
@@ -752,47 +776,31 @@ def clicked10():
 # 24600 Steps (MX: Achtelschritt) entsprechen 618 Millimeter Fahrweg
 
 def press_7(event):
-    clicked16()
+    run(clicked16)
 
 def clicked16():
     global ge
     print("Programm 7...")
-    if(ge):
-       txt.insert(END,"Programm 7...\n")
-       txt.see(END)
-       frm.update()
-
-    time.sleep(2)
-    clupd(">", ">")
-    stepper(0, 0, 27000, 1, 0)  #Nullung
-    clupd("<", "<")
-    time.sleep(2)
-    stepper(0, 1, 400, 1, 1)    #Pos 1 (Ausgangsposition)
-    clupd("0", "0")
-    time.sleep(2)
-    shot("07","00")
-    time.sleep(2)
-
-    clupd("<<", "<<")
-    stepper(0, 1, 12300, 1, 1)  #Pos 2
-    clupd("1", "309")
-    time.sleep(2)
-    shot("07","01")
-    time.sleep(2)
-
-    clupd("<<", "<<")
-    stepper(0, 1, 12300, 1, 1)  #Pos 3
-    clupd("2", "618")
-    time.sleep(2)
-    shot("07","02")
-
+    tout("Programm 7...\n")
+
+    nullung(False)              #Pos 1 (Ausgangsposition)
+    program("07", [
+        ('shot', "00"),
+        ('dwell', AFTERSHOT),
+        ('show', "<<", "<<"),
+        ('move', [(0, 1, 12300)], 1, 1),  #Pos 2
+        ('show', "1", "309"),
+        ('shot', "01"),
+        ('dwell', AFTERSHOT),
+        ('show', "<<", "<<"),
+        ('move', [(0, 1, 12300)], 1, 1),  #Pos 3
+        ('show', "2", "618"),
+        ('shot', "02"),
+    ])
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Programm 8
@@ -803,57 +811,23 @@ def clicked16():
 #  18 Grad:  10 Vollschritte oder  160 1/16-Schritte
 
 def press_8(event):
-    clicked17()
+    run(clicked17)
 
 def clicked17():
     global ge
     print("Programm 8...")
-    if(ge):
-       txt.insert(END,"Programm 8...\n")
-       txt.see(END)
-       frm.update()
-
-    clupd("0", "0")
-    time.sleep(2)
-    shot("08","00")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("1", "18")
-    time.sleep(2)
-    shot("08","01")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("2", "36")
-    time.sleep(2)
-    shot("08","02")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("3", "54")
-    time.sleep(2)
-    shot("08","03")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("4", "72")
-    time.sleep(2)
-    shot("08","04")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("5", "90")
-    time.sleep(2)
-    shot("08","05")
+    tout("Programm 8...\n")
 
+    # 5 x 160 Schritte MY, Aufnahme an jeder Position
+    seq = [('show', "0", "0"), ('shot', "00")]
+    for i in range(1, 6):
+        seq = seq + [('dwell', AFTERSHOT), ('move', [(1, 0, 160)], 1, 1), ('show', str(i), str(18 * i)),
+                     ('shot', "%02d" % i)]
+    program("08", seq)
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Programm 9
@@ -864,146 +838,126 @@ def clicked17():
 #  18 Grad:  10 Vollschritte oder  160 1/16-Schritte
 
 def press_9(event):
-    clicked18()
+    run(clicked18)
 
 def clicked18():
     global ge
     print("Programm 9...")
-    if(ge):
-       txt.insert(END,"Programm 9...\n")
-       txt.see(END)
-       frm.update()
+    tout("Programm 9...\n")
 
-    clupd("0", "0")
-    time.sleep(2)
-    shot("09","00")
-    time.sleep(2)
+    # 20 x 160 Schritte MY, Aufnahme an jeder Position
+    seq = [('show', "0", "0"), ('shot', "00")]
+    for i in range(1, 21):
+        seq = seq + [('dwell', AFTERSHOT), ('move', [(1, 0, 160)], 1, 1), ('show', str(i), str(18 * i)),
+                     ('shot', "%02d" % i)]
+    program("09", seq)
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("1", "18")
-    time.sleep(2)
-    shot("09","01")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("2", "36")
-    time.sleep(2)
-    shot("09","02")
-    time.sleep(2)
-
-    stepper(1, 0, 160, 1, 1)
-    clupd("3", "54")
-    time.sleep(2)
-    shot("09","03")
-    time.sleep(2)
+    print("...fertig.")
+    print("----------------------------------------------------------")
+    tout("...fertig.\n")
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("4", "72")
-    time.sleep(2)
-    shot("09","04")
-    time.sleep(2)
+#-----------------------------------------------------------------------------
+# Nachfuehrung
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("5", "90")
-    time.sleep(2)
-    shot("09","05")
-    time.sleep(2)
+# MY mit TRACK_RATE (siderisch: ein 1/16-Schritt alle 26.9 s) ueber TRACK_SECS,
+# Aufnahmen in den Luecken zwischen den Schritten
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("6", "108")
-    time.sleep(2)
-    shot("09","06")
-    time.sleep(2)
+def press_f(event):
+    run(clicked22)
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("7", "126")
-    time.sleep(2)
-    shot("09","07")
-    time.sleep(2)
+def clicked22():
+    global ge
+    print("Nachfuehrung...")
+    tout("Nachfuehrung...\n")
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("8", "144")
-    time.sleep(2)
-    shot("09","08")
-    time.sleep(2)
+    shots = [0]
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("9", "162")
-    time.sleep(2)
-    shot("09","09")
-    time.sleep(2)
+    def expose():
+        shots[0] = shots[0] + 1
+        shot("10", "%03d" % shots[0])
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("10", "180")
-    time.sleep(2)
-    shot("09","10")
-    time.sleep(2)
+    rate = fototrack.rate_steps(TRACK_RATE)
+    print("MY %.5f Schritte/s (ein Schritt alle %.1f s) fuer %d s" % (rate, 1.0 / rate, TRACK_SECS))
+    tr = fototrack.Tracker(lambda n: steps(1, TRACK_DIR, n), rate, TRACK_SECS, expose, TRACK_EXPOSURE,
+                           getattr(time, 'monotonic', time.time), time.sleep, check, logpath=TRACKLOG)
+    try:
+        st = tr.run()
+    finally:
+        steps(1, TRACK_DIR, 0, False)
+    print(fototrack.summary(st))
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("11", "198")
-    time.sleep(2)
-    shot("09","11")
-    time.sleep(2)
+    print("...fertig.")
+    print("----------------------------------------------------------")
+    tout("...fertig.\n")
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("12", "216")
-    time.sleep(2)
-    shot("09","12")
-    time.sleep(2)
+#-----------------------------------------------------------------------------
+# Zielverfolgung
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("13", "234")
-    time.sleep(2)
-    shot("09","13")
-    time.sleep(2)
+# ganze Schiene nach links, MY haelt das Ziel (AIM_DIST/AIM_OFFSET) in der Bildmitte,
+# AIM_SHOTS Abschnitte mit einer Aufnahme an jedem Halt
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("14", "252")
-    time.sleep(2)
-    shot("09","14")
-    time.sleep(2)
+def press_z(event):
+    run(clicked23)
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("15", "270")
-    time.sleep(2)
-    shot("09","15")
-    time.sleep(2)
+def clicked23():
+    global ge
+    print("Zielverfolgung...")
+    tout("Zielverfolgung...\n")
+
+    nullung(False)
+    q = fotoaim.schedule(fotoaim.RAIL_STEPS, AIM_DIST, AIM_OFFSET)
+    xs = fotoaim.intervals(fotoaim.RAIL_STEPS, AIM_SHOTS)
+    pause(SETTLE)
+    shot("11", "00")
+    for i in range(1, len(xs)):
+        aim(fotoaim.RAIL_STEPS, 1, AIM_DIST, AIM_OFFSET, xs[i - 1], xs[i])
+        last = ({0: xs[i] - xs[i - 1], 1: int(q[xs[i]] - q[xs[i - 1]])}, 1, time.time())
+        clupd(str(i), "%.1f" % (q[xs[i]] * 360.0 / fotoaim.TURN))
+        settle(last)
+        shot("11", "%02d" % i)
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("16", "288")
-    time.sleep(2)
-    shot("09","16")
-    time.sleep(2)
+    print("...fertig.")
+    print("----------------------------------------------------------")
+    tout("...fertig.\n")
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("17", "306")
-    time.sleep(2)
-    shot("09","17")
-    time.sleep(2)
+#-----------------------------------------------------------------------------
+# Kalibrierung der Beruhigungszeit
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("18", "324")
-    time.sleep(2)
-    shot("09","18")
-    time.sleep(2)
+# nach jeder Testfahrt (SETTLE_TESTS) Vorschaubilder, bis die Schaerfe bleibt,
+# daraus base/tau je Achse (fotosettle.py), gespeichert in SETTLEFILE
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("19", "342")
-    time.sleep(2)
-    shot("09","19")
-    time.sleep(2)
+def press_k(event):
+    run(clicked24)
 
-    stepper(1, 0, 160, 1, 1)
-    clupd("20", "360")
-    time.sleep(2)
-    shot("09","20")
+def clicked24():
+    global ge, cfl
+    print("Kalibrierung Beruhigung...")
+    tout("Kalibrierung Beruhigung...\n")
+
+    if not cfl:
+       print("Kamera aus, keine Kalibrierung.")
+       tout("Kamera aus.\n")
+       return
+    nullung(False)
+    cam.preview()  # Sitzung oeffnen, bevor die Zeit zaehlt
+    samples = {}
+    for mot, dir, n in SETTLE_TESTS:
+        clupd(">", str(n))
+        stepper(mot, dir, n, 1, 0)
+        secs = fotosettle.measure(cam.preview, time.time, pause, time.time())
+        x = fotosettle.excitation({mot: n}, 1, settling.axes)[mot]
+        samples.setdefault(mot, []).append((x, secs))
+        print("M%s %5d Schritte: ruhig nach %.2f s (bisher %.2f s)" %
+              ("XYZA"[mot], n, secs, settling.axis(mot, x)))
+    for mot in sorted(samples):
+        settling.fit(mot, samples[mot])
+    settling.save()
+    print(fotosettle.summary(settling))
+    clupd("0", "0")
 
     print("...fertig.")
     print("----------------------------------------------------------")
-    if(ge):
-       txt.insert(END,"...fertig.\n")
-       txt.see(END)
-       frm.update()
+    tout("...fertig.\n")
 
 #-----------------------------------------------------------------------------
 # Hilfe (X-Modus)
@@ -1023,6 +977,9 @@ def clicked19():
        txt.insert(END,"7   - P7 -  3 Fotos linear\n")
        txt.insert(END,"8   - P8 -  5 Fotos  90 Grad\n")
        txt.insert(END,"9   - P9 - 20 Fotos 360 Grad\n")
+       txt.insert(END,"f   - Nachfuehrung MY siderisch\n")
+       txt.insert(END,"z   - Zielverfolgung mit Aufnahmen\n")
+       txt.insert(END,"k   - Kalibrierung Beruhigung\n")
        txt.insert(END,"c   - Kamera ausloesen\n")
        txt.see(END)
        frm.update()
@@ -1031,7 +988,7 @@ def clicked19():
 # Kamera ausloesen
 
 def press_c(event):
-    clicked20()
+    run(clicked20)
 
 def clicked20():
     global ge, cfl
@@ -1041,30 +998,21 @@ def clicked20():
 
     if cfl:
        print("Aufnahme...")
-       if(ge):
-          txt.insert(END,"Aufnahme...\n")
-          txt.see(END)
-          frm.update()
+       tout("Aufnahme...\n")
 
        shot("99","00")
 
        print("...fertig.")
        print("----------------------------------------------------------")
-       if(ge):
-          txt.insert(END,"...fertig.\n")
-          txt.see(END)
-          frm.update()
+       tout("...fertig.\n")
     else:
        cfl = True
 
        print("...Kamera eingeschalten.")
        print("----------------------------------------------------------")
+       tout("...Kamera eingeschalten.\n")
        if(ge):
-          txt.insert(END,"...Kamera eingeschalten.\n")
-          txt.see(END)
-          txt3.delete(1.0, END)
-          txt3.insert(END,"Kamera ein.")
-          frm.update()
+          gui(fset, "Kamera ein.")
 
 def shot(pr,pn):
     global ge, pc, sr, cfl
@@ -1085,45 +1033,189 @@ def shot(pr,pn):
     #callback_obj = gp.check_result(gp.use_python_logging())
 
     if cfl:
-       camera = gp.Camera()
-       camera.init()
-       file_path = camera.capture(gp.GP_CAPTURE_IMAGE)
-
        dfile = pcstr + "_" + pr + pn + ".jpg"
-       target = os.path.join('/media/pi/STICK/images/' + sr,dfile)
+       target = os.path.join(IMGDIR + sr,dfile)
        fupd(dfile)
 
-       camera_file = camera.file_get(file_path.folder, file_path.name, gp.GP_FILE_TYPE_NORMAL)
-       camera_file.save(target)
-       camera.exit()
+       # eine Kamerasitzung fuer alle Aufnahmen (see fotocam.py)
+       if camev is not None:
+          # nicht auf die Datei warten, der Ereignis-Thread ordnet sie der Position zu
+          for i in range(BURST):
+             if BURST > 1:
+                target = os.path.join(IMGDIR + sr, pcstr + "_" + pr + pn + "-" + str(i + 1) + ".jpg")
+             cam.fire(target, list(position.pos), time.sleep)
+             cam.add(cam.last['total_s'])
+             print(fotocam.shot_summary(cam.last, "Datei per Ereignis"))
+          # aber die naechste Fahrt erst nach der Belichtung
+          t = time.time()
+          if not camev.wait_exposed(cam.released, t + EXPOSURE, time.time, pause):
+             print("Kein Belichtungsende gemeldet, weiter nach %.1f s" % EXPOSURE)
+          return
+       if cammode == 'card':
+          # nur Ordner/Name merken, geladen wird nach dem Programm
+          cam.defer(cam.trigger(), target)
+          cam.add(cam.last['total_s'])
+          print(fotocam.shot_summary(cam.last, "Laden am Programmende"))
+          return
+       if camdl is None:
+          cam.capture(target)
+       else:
+          # nur das Ausloesen wartet, das Bild laedt waehrend der naechsten Fahrt
+          path = cam.trigger()
+          cam.add(cam.last['total_s'])
+          camdl.put(path, target)
+       print(fotocam.shot_summary(cam.last))
     else:
        fupd("Kamera aus.")
 
+# Kamerasitzung schliessen, Latenzen ausgeben (einmal, auch wenn mehrere Wege beenden)
+
+camreported = 0
+
+def camclose():
+    global camreported
+    camdrain()
+    cam.close()
+    if cam.shots == camreported:
+        return
+    camreported = cam.shots
+    if cam.shots > 0:
+        print(fotocam.summary(cam))
+    if camdl is not None and camdl.done + camdl.errors > 0:
+        print(fotocam.download_summary(camdl))
+    if camev is not None and cam.shots > 0:
+        print(fotocam.event_summary(camev))
+
+# am Programmende: alle Bilder der Schlange sind gespeichert
+
+def camdrain():
+    if camev is not None:
+       camev.drain(time.sleep)
+    if camdl is not None:
+       camdl.drain()
+    if cam.pending:
+       t = time.time()
+       n = len(cam.pending)
+       print("Lade %d Bilder von der Karte..." % n)
+       print(fotocam.flush_summary(cam, cam.flush(), time.time() - t))
+
 #-----------------------------------------------------------------------------
 # Textboxen updaten
 
 def clupd(str1, str2):
     global ge
     if(ge):
-       txt1.delete(1.0, END)
-       txt1.insert(END,str1)
-       txt2.delete(1.0, END)
-       txt2.insert(END,str2)
-       frm.update()
+       gui(clset, str1, str2)
     print(str1)
     print(str2)
 
+def clset(str1, str2):
+    txt1.delete(1.0, END)
+    txt1.insert(END,str1)
+    txt2.delete(1.0, END)
+    txt2.insert(END,str2)
+
 #-----------------------------------------------------------------------------
 # Fotobox updaten
 
 def fupd(str1):
     global ge
     if(ge):
-       txt3.delete(1.0, END)
-       txt3.insert(END,str1)
-       frm.update()
+       gui(fset, str1)
     print(str1)
 
+def fset(str1):
+    txt3.delete(1.0, END)
+    txt3.insert(END,str1)
+
+#-----------------------------------------------------------------------------
+# Textbox ausgeben
+
+def tout(str1):
+    global ge
+    if(ge):
+       gui(tset, str1)
+
+def tset(str1):
+    txt.insert(END,str1)
+    txt.see(END)
+
+#-----------------------------------------------------------------------------
+# motion worker helpers
+# run(func) - X mode: queue the program in the worker, terminal mode: run it directly
+# gui(func, args) - Tk calls from the worker are done later in the Tk thread
+# pause(secs) / check() - cancellable waiting / cancel point inside a program
+
+def run(func):
+    global worker
+    if worker is None:
+       estop.clear()
+       estop.active = True
+       try:
+          func()
+       except fotostop.Stopped:
+          cancelled(func.__name__)
+       finally:
+          estop.active = False
+          camdrain()
+    else:
+       if worker.busy is not None:
+          tout("Warte (" + worker.busy + " laeuft)...\n")
+       worker.submit(func.__name__, lambda: started(func))
+
+# im Worker: ein neuer Job beginnt ohne alten Not-Halt
+
+def started(func):
+    estop.clear()
+    estop.active = True
+    try:
+       func()
+    finally:
+       estop.active = False
+       camdrain()
+
+def gui(func, *args):
+    global worker
+    if worker is None:
+       func(*args)
+    else:
+       worker.call(func, *args)
+
+def pause(secs):
+    global worker
+    if worker is None:
+       estop.sleep(secs)
+    else:
+       worker.sleep(secs)
+
+def check():
+    global worker
+    if worker is not None:
+       worker.check()
+    estop.check()
+
+def pump():
+    worker.pump()
+    win.after(40, pump)
+
+#-----------------------------------------------------------------------------
+# Abbruch (Stop-Button, Escape), Not-Halt mit Bremsrampe, dann Abbruch des Programms
+
+def press_esc(event):
+    clicked21()
+
+def clicked21():
+    global worker
+    if worker is not None and worker.busy is not None:
+       print("Abbruch...")
+       estop.trigger("Stop-Taste")
+
+def cancelled(name):
+    print("...abgebrochen.")
+    print("----------------------------------------------------------")
+    tout("...abgebrochen.\n")
+    clupd("!", "!")
+
 #-----------------------------------------------------------------------------
 # Hilfe (Textmodus)
 
@@ -1144,6 +1236,9 @@ def help():
   print("8   -  Programm 8 (90 Grad in 5 Aufnahmen)")
   print("9   -  Programm 9 (360 Grad in 20 Aufnahmen)")
   print("h   -  Hilfe (diese Ausgabe)")
+  print("f   -  Nachfuehrung (MY siderisch, Aufnahmen)")
+  print("z   -  Zielverfolgung (Ziel in der Bildmitte, Aufnahmen)")
+  print("k   -  Kalibrierung der Beruhigungszeit (Vorschaubilder)")
   print("c   -  Kamera ausloesen")
   print(" ")
   print( "Warte auf Eingabe...")
@@ -1160,8 +1255,11 @@ subprocess.call(["sudo","killall","/usr/lib/gvfs/gvfsd-gphoto2"])
 # zufaellige Zeichenfolge zur Bildspeicherung erzeugen
 
 sr = str(randint(0,9))+str(randint(0,9))+str(randint(0,9))+str(randint(0,9))+str(randint(0,9))+str(randint(0,9))+str(randint(0,9))+str(randint(0,9))
-srdir = "/media/pi/STICK/images/" + sr
-subprocess.call(["mkdir",srdir])
+srdir = IMGDIR + sr
+if sim:
+    os.makedirs(srdir)
+else:
+    subprocess.call(["mkdir",srdir])
 
 
 print(" ")
@@ -1201,6 +1299,42 @@ for pin in dir_pins:
 GPIO.setup(en, GPIO.OUT)
 GPIO.output(en, True)
 
+# emergency stop: GUI, SIGUSR1 (kill -USR1), Ctrl-C in terminal mode, ESTOP_PIN (see fotostop.py)
+
+estop = fotostop.EStop(time.time, time.sleep)
+estop.watch_signal(signal.SIGUSR1)
+if ESTOP_PIN is not None:
+    estop.watch_gpio(GPIO, ESTOP_PIN)
+
+# the motion engine with everything the steps need (see fotomotor.py)
+# pulse backend (pigpio, RPi.GPIO or sim, see fotopulse.py), step timestamps (fototiming.py),
+# absolute position (fotoposition.py), compiled step plans (fotocache.py), endstop (fotoendstop.py)
+# stop - the emergency stop flag the engine looks at
+
+def motion_setup(stop):
+    if sim:
+        pulse = rig.backend(control_pins, dir_pins)
+        rig.estop = stop.trigger
+        stop.clock = time.time
+    else:
+        pulse = fotopulse.backend()
+    steplog = fototiming.StepLog()
+    pulse.log = steplog
+    pulse.setup(control_pins)
+    return fotomotor.Motion(pulse, GPIO, en, control_pins, dir_pins,
+                            fotoendstop.Endstop(i2c, I2C_ADDR, 0x04, ESTEP, ESTOP_INT, gpio=GPIO),
+                            fotoposition.Position(POSFILE), steplog, stop, fotocache.StepCache(CACHEDIR),
+                            home=HOME, emargin=EMARGIN, cstep=CSTEP, packet_ms=PACKET_MS,
+                            pulse_us=PULSE_US, shape=prof, logpath=STEPLOG)
+
+# FOTO_MOTION=proc - motion in its own process, commands and status in shared memory
+
+motionproc = os.environ.get('FOTO_MOTION', '') == 'proc'
+if motionproc:
+    motion = fotomotor.MotionProc(motion_setup)
+else:
+    motion = motion_setup(estop)
+position = motion.position
 
 #-----------------------------------------------------------------------------
 # when in X mode
@@ -1228,7 +1362,7 @@ if(ge):
     btn3 = Button(master = frm, text="Exit", font=("Helvetica", 11, "bold"), command=clicked3)
     btn3.place(x=160, y=14, width=60, height=30)
 
-    btn4 = Button(master = frm, text="Nullung", font=("Helvetica", 11, "bold"), command=clicked11)
+    btn4 = Button(master = frm, text="Nullung", font=("Helvetica", 11, "bold"), command=lambda: run(clicked11))
     btn4.place(x=232, y=14, width=65, height=30)
 
     btn11 = Button(master = frm, text="Hilfe", font=("Helvetica", 11, "bold"), command=clicked19)
@@ -1236,36 +1370,36 @@ if(ge):
 
     # untere Reihe
 
-    btn5 = Button(master = frm, text="Links", font=("Helvetica", 11, "bold"), command=clicked12)
+    btn5 = Button(master = frm, text="Links", font=("Helvetica", 11, "bold"), command=lambda: run(clicked12))
     btn5.place(x=16, y=276, width=46, height=30)
 
-    btn6 = Button(master = frm, text="Rechts", font=("Helvetica", 11, "bold"), command=clicked13)
+    btn6 = Button(master = frm, text="Rechts", font=("Helvetica", 11, "bold"), command=lambda: run(clicked13))
     btn6.place(x=74, y=276, width=55, height=30)
 
-    btn7 = Button(master = frm, text="L-Schw", font=("Helvetica", 11, "bold"), command=clicked7)
+    btn7 = Button(master = frm, text="L-Schw", font=("Helvetica", 11, "bold"), command=lambda: run(clicked7))
     btn7.place(x=141, y=276, width=63, height=30)
 
-    btn8 = Button(master = frm, text="R-Schw", font=("Helvetica", 11, "bold"), command=clicked8)
+    btn8 = Button(master = frm, text="R-Schw", font=("Helvetica", 11, "bold"), command=lambda: run(clicked8))
     btn8.place(x=216, y=276, width=63, height=30)
 
-    btn15 = Button(master = frm, text="Cam", font=("Helvetica", 11, "bold"), command=clicked20)
+    btn15 = Button(master = frm, text="Cam", font=("Helvetica", 11, "bold"), command=lambda: run(clicked20))
     btn15.place(x=291, y=276, width=48, height=30)
 
     # rechte Seite
 
-    btn9 = Button(master = frm,  text="P5  2M li", font=("Helvetica", 11, "bold"), command=clicked9)
+    btn9 = Button(master = frm,  text="P5  2M li", font=("Helvetica", 11, "bold"), command=lambda: run(clicked9))
     btn9.place(x=384, y=14, width=80, height=30)
 
-    btn10 = Button(master = frm, text="P6  2M re", font=("Helvetica", 11, "bold"), command=clicked10)
+    btn10 = Button(master = frm, text="P6  2M re", font=("Helvetica", 11, "bold"), command=lambda: run(clicked10))
     btn10.place(x=384, y=56, width=80, height=30)
 
-    btn12 = Button(master = frm, text="P7  3F Sl", font=("Helvetica", 11, "bold"), command=clicked16)
+    btn12 = Button(master = frm, text="P7  3F Sl", font=("Helvetica", 11, "bold"), command=lambda: run(clicked16))
     btn12.place(x=384, y=98, width=80, height=30)
 
-    btn13 = Button(master = frm, text="P8  5F Ro", font=("Helvetica", 11, "bold"), command=clicked17)
+    btn13 = Button(master = frm, text="P8  5F Ro", font=("Helvetica", 11, "bold"), command=lambda: run(clicked17))
     btn13.place(x=384, y=140, width=80, height=30)
 
-    btn14 = Button(master = frm, text="P9 20F360", font=("Helvetica", 11, "bold"), command=clicked18)
+    btn14 = Button(master = frm, text="P9 20F360", font=("Helvetica", 11, "bold"), command=lambda: run(clicked18))
     btn14.place(x=384, y=182, width=80, height=30)
 
     txt1 = Text(master = frm, wrap='word', width=5, height=1, bg='#fe9', font=("Mono", 11, "bold"))
@@ -1282,8 +1416,11 @@ if(ge):
     scroll = Scrollbar(master = frm)
     scroll.config(command = txt.yview)
     txt.config(yscrollcommand = scroll.set)
-    txt.place(x=20, y=58, width=340, height=203)
-    scroll.place(x=360, y=58, width=10, height=203)
+    txt.place(x=20, y=58, width=340, height=170)
+    scroll.place(x=360, y=58, width=10, height=170)
+
+    btn16 = Button(master = frm, text="Stop", font=("Helvetica", 11, "bold"), bg='#f99', command=clicked21)
+    btn16.place(x=20, y=236, width=350, height=30)
 
     clicked19() # X-Hilfe/Startscreen in der Textbox
 
@@ -1311,6 +1448,18 @@ if(ge):
     win.bind('9',press_9)
     win.bind('h',press_h)
     win.bind('c',press_c)
+    win.bind('f',press_f)
+    win.bind('z',press_z)
+    win.bind('k',press_k)
+    win.bind('<Escape>',press_esc)
+
+    # Programme laufen im Worker, die Oberflaeche bleibt bedienbar
+    if sim:
+        worker = fotoworker.Worker(cancelled, time.sleep)
+    else:
+        worker = fotoworker.Worker(cancelled)
+    estop.notify = worker.cancel
+    win.after(40, pump)
 
     win.mainloop()
 
@@ -1319,6 +1468,9 @@ if(ge):
 
 else:
 
+   # Ctrl-C haelt ein laufendes Programm an, sonst wie gewohnt
+   estop.watch_signal(signal.SIGINT, signal.default_int_handler)
+
    global done
    done = False
    key = ' '
@@ -1326,7 +1478,10 @@ else:
 
    while not done:
 
-       key = raw_input()
+       try:
+           key = raw_input()
+       except EOFError:
+           break
        if key   == 'r':
            press_r(0)
        elif key   == 's':
@@ -1383,6 +1538,16 @@ else:
            help()
        elif key   == 'c':
            press_c(0)
+       elif key   == 'f':
+           press_f(0)
+       elif key   == 'z':
+           press_z(0)
+       elif key   == 'k':
+           press_k(0)
+
+   camclose()
+   if sim:
+       rig.report()
 
 #-----------------------------------------------------------------------------
 
@@ -0,0 +1,91 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : subject tracking, fotoaim.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-02-01
+# Last modified : 2020-02-01
+#
+# Keeps a subject centred while MX slides: the pan angle along the rail
+# is atan((offset - s) / dist), s the travel in mm (618 mm = 24600 steps),
+# dist the distance of the subject from the rail, offset its position
+# along the rail from the start of the move. The MY step count of every
+# MX step is computed for the whole rail at once, a move then steps both
+# axes from one merged mask stream (MX on every tick).
+#
+#   python fotoaim.py            schedule of a full rail run
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import math
+import numpy as np
+
+# Schiene 618 mm in 24600 1/8-Schritten MX (0.0251 mm je Schritt, wie in foto.py),
+# MY 3200 1/16-Schritte je Umdrehung
+RAIL_MM = 618.0
+RAIL_STEPS = 24600
+TURN = 3200
+
+#-----------------------------------------------------------------------------
+# coupled schedule
+# nx - MX steps of the whole move, dist_mm/offset_mm - subject as above
+# returns the MY steps done after every MX step (int64, nx + 1 values, rising),
+# the camera points at the subject at the start
+
+def schedule(nx, dist_mm, offset_mm):
+    s = np.arange(nx + 1, dtype=np.float64) * (RAIL_MM / RAIL_STEPS)
+    theta = np.arctan2(offset_mm - s, dist_mm)
+    return np.rint((theta[0] - theta) * (TURN / (2.0 * math.pi))).astype(np.int64)
+
+# step masks of the MX steps a .. b-1, None if MY would need more than one step per tick
+
+def masks(q, a, b, xbit, ybit):
+    d = np.diff(q[a:b + 1])
+    if len(d) > 0 and d.max() > 1:
+        return None
+    m = np.full(b - a, xbit, dtype=np.int64)
+    m[d > 0] |= ybit
+    return m
+
+# highest MY/MX step ratio over the MX steps a .. b (the profile must respect it),
+# from the derivative of the angle, dist / (dist^2 + (offset - s)^2) per mm
+
+def peak_ratio(a, b, dist_mm, offset_mm):
+    mm = RAIL_MM / RAIL_STEPS
+    s = np.clip(offset_mm, a * mm, b * mm)
+    return TURN / (2.0 * math.pi) * mm * dist_mm / (dist_mm * dist_mm + (offset_mm - s) ** 2)
+
+# MY direction: moving left (MX 1) the subject in front passes to the right (MY 0)
+
+def pan_dir(dirx):
+    return 1 - dirx
+
+# MX boundaries of shots intervals over nx steps (shots + 1 values)
+
+def intervals(nx, shots):
+    return [nx * i // shots for i in range(shots + 1)]
+
+#-----------------------------------------------------------------------------
+# full rail, subject 0.6 m in front of the rail centre: python fotoaim.py
+
+if __name__ == "__main__":
+    import time
+    dist = 600.0
+    off = RAIL_MM / 2.0
+    t = time.time()
+    q = schedule(RAIL_STEPS, dist, off)
+    ms = (time.time() - t) * 1000.0
+    m = masks(q, 0, RAIL_STEPS, 1 << 5, 1 << 6)
+    print("Schiene %d Schritte, Ziel %.0f mm vor der Mitte: MY %d Schritte (%.1f Grad) in %.1f ms" %
+          (RAIL_STEPS, dist, q[-1], q[-1] * 360.0 / TURN, ms))
+    print("MY/MX: Mitte %.4f, Rand %.4f, linear waere %.4f" %
+          (peak_ratio(0, RAIL_STEPS, dist, off), peak_ratio(0, 0, dist, off), q[-1] / float(RAIL_STEPS)))
+    for i, x in enumerate(intervals(RAIL_STEPS, 6)):
+        print("  Aufnahme %d bei MX %5d: MY %4d (%.2f Grad, linear %.2f)" %
+              (i, x, q[x], q[x] * 360.0 / TURN, q[-1] * x / float(RAIL_STEPS) * 360.0 / TURN))
+    print("Masken: %d Ticks, MY %d" % (len(m), np.count_nonzero(m & (1 << 6))))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : step plan cache, fotocache.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-26
+# Last modified : 2020-01-26
+#
+# A compiled move is kept as one int64 array: row 0 the tick offsets in
+# microseconds (one more than ticks, the last is the end), row 1 the step
+# mask of every tick. Plans are memoized in memory and saved as .npy files
+# named after the program and a hash of everything they depend on (moves,
+# speed, profile, pins, axis limits). Later runs load them with mmap.
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import os
+import json
+import hashlib
+import numpy as np
+
+# bump when the plan layout changes
+VERSION = 1
+
+#-----------------------------------------------------------------------------
+# plan array <-> masks and periods
+
+def pack(masks, periods):
+    n = len(masks)
+    plan = np.zeros((2, n + 1), dtype=np.int64)
+    np.cumsum(periods, out=plan[0, 1:])
+    plan[1, :n] = masks
+    return plan
+
+def unpack(plan):
+    n = plan.shape[1] - 1
+    return plan[1, :n], np.diff(plan[0])
+
+#-----------------------------------------------------------------------------
+# the cache
+# path - directory of the .npy files (None = memory only)
+
+class StepCache(object):
+
+    def __init__(self, path=None):
+        self.path = path
+        self.mem = {}
+        self.hits = 0
+        self.loads = 0
+        self.builds = 0
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, name, params):
+        h = hashlib.sha1(json.dumps([VERSION, params], sort_keys=True).encode("ascii"))
+        return "%s-%s" % (name, h.hexdigest()[:12])
+
+    # get(name, params, build) - build() returns masks, periods
+    # returns masks, periods (views on the cached plan)
+
+    def get(self, name, params, build):
+        key = self.key(name, params)
+        if key in self.mem:
+            self.hits = self.hits + 1
+            return unpack(self.mem[key])
+        plan = None
+        if self.path is not None:
+            fn = os.path.join(self.path, key + ".npy")
+            if os.path.exists(fn):
+                try:
+                    plan = np.load(fn, mmap_mode='r')
+                    self.loads = self.loads + 1
+                except (IOError, ValueError):
+                    plan = None
+        if plan is None:
+            masks, periods = build()
+            plan = pack(masks, periods)
+            self.builds = self.builds + 1
+            if self.path is not None:
+                self.save(fn, plan)
+        self.mem[key] = plan
+        return unpack(plan)
+
+    # atomar ueber eine Temporaerdatei, ein halber Plan wird nie geladen
+
+    def save(self, fn, plan):
+        tmp = fn + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, plan)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, fn)
+
+#-----------------------------------------------------------------------------
+# P5 compile time, cold and from the cache: python fotocache.py
+
+if __name__ == "__main__":
+    import time
+    import tempfile
+    import fotomotion
+    import fotoprofile
+
+    counts = {0: 24600, 1: 800}
+    bits = {0: 1 << 5, 1: 1 << 6}
+
+    def build():
+        return fotomotion.dda(counts, bits), fotoprofile.axis_profile_n(counts, 1)
+
+    d = tempfile.mkdtemp(prefix="fotocache")
+    params = [sorted(counts.items()), 1, "trap", sorted(bits.items()), sorted(fotoprofile.AXES.items())]
+
+    t = time.time()
+    masks, periods = build()
+    fotomotion.ticks(masks)
+    print("P5 %-14s: %6.1f ms bis zum ersten Paket" % ("alt", (time.time() - t) * 1000.0))
+
+    cache = StepCache(d)
+    for label in ("neu berechnet", "Datei (mmap)", "Speicher"):
+        if label == "Datei (mmap)":
+            cache = StepCache(d)
+        t = time.time()
+        masks, periods = cache.get("P5", params, build)
+        fotomotion.ticks(masks[:400])
+        print("P5 %-14s: %6.1f ms bis zum ersten Paket" % (label, (time.time() - t) * 1000.0))
@@ -0,0 +1,522 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : camera session, fotocam.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-02-02
+# Last modified : 2020-02-02
+#
+# One gphoto2 camera session for all shots and programs instead of
+# Camera()/init()/exit() per frame (USB and PTP session setup each time).
+# After an idle time the connection is checked with a short PTP request;
+# a gphoto2 error during a shot closes the session, opens a new one and
+# repeats the shot. Every shot's latency is measured, the summary holds
+# the cost of opening and closing the session, i.e. what each shot paid
+# before.
+# Downloader moves file_get and save into a background thread with a
+# bounded queue: the shutter release stays synchronous, the slider goes
+# on to the next position while the last frame is still transferring.
+# The session lock keeps camera calls of both threads apart.
+# Solange ein Bild auf den Download wartet, muss es auf der Karte liegen:
+# ausser bei sync/pershot stellt die Sitzung capturetarget auf die Karte.
+# In card mode the camera writes to its memory card, a shot only keeps
+# folder/name and flush() downloads them all after the program.
+# Event mode fires trigger_capture() without waiting for the file; the
+# EventWatcher thread reads FILE_ADDED events and matches them in order
+# to the shots fired (a RAW+JPEG pair to the same shot), so bursts and
+# brackets run at camera speed instead of one PTP round trip per frame.
+# The slider must not move while the camera exposes: exposed() waits for
+# CAPTURE_COMPLETE (or the file) of the frames released, at most the
+# configured exposure time.
+#
+#   FOTO_CAM=pershot python foto.py     old behaviour, init/exit per shot
+#   FOTO_CAM=card python foto.py        capture to card, bulk download
+#   FOTO_CAM=event python foto.py       trigger_capture and camera events
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import os
+import time
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Verbindung pruefen nach so vielen Sekunden ohne Aufnahme, Wiederholungen je Aufnahme
+IDLE = 10.0
+RETRIES = 2
+
+# Ereignisse: Wartezeit je Abfrage in ms, Kamera beschaeftigt: so oft erneut, Zeit bis eine Datei fehlt
+EVENT_MS = 50
+BUSY_TRIES = 100
+LOST_S = 30.0
+
+#-----------------------------------------------------------------------------
+# the camera session
+# gp - gphoto2 module (or the simulated one), clock - time source
+# pooled - keep the session open between shots (False = init/exit per shot as before)
+# card - set the capture target to the memory card on every connect
+
+class CameraSession(object):
+
+    def __init__(self, gp, clock=time.time, pooled=True, card=False):
+        self.gp = gp
+        self.clock = clock
+        self.pooled = pooled
+        self.card = card
+        self.pending = []
+        self.flushed = 0
+        self.flush_s = 0.0
+        self.lost = 0
+        self.fired = []
+        self.released = 0
+        self.camera = None
+        self.t_used = None
+        self.opens = 0
+        self.open_s = 0.0
+        self.closes = 0
+        self.close_s = 0.0
+        self.checks = 0
+        self.reconnects = 0
+        self.shots = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.camera is None:
+            t = self.clock()
+            camera = self.gp.Camera()
+            camera.init()
+            if self.card:
+                self.to_card(camera)
+            self.camera = camera
+            self.opens = self.opens + 1
+            self.open_s = self.open_s + self.clock() - t
+            self.t_used = self.clock()
+        return self.camera
+
+    def close(self):
+        if self.camera is None:
+            return
+        t = self.clock()
+        try:
+            self.camera.exit()
+        except self.gp.GPhoto2Error:
+            pass
+        self.camera = None
+        self.closes = self.closes + 1
+        self.close_s = self.close_s + self.clock() - t
+
+    # capturetarget auf die Speicherkarte (Nikon: "Memory card", Canon: "Memory card" / 1)
+
+    def to_card(self, camera):
+        try:
+            config = camera.get_config()
+            node = config.get_child_by_name('capturetarget')
+            choices = [node.get_choice(i) for i in range(node.count_choices())]
+            card = [c for c in choices if 'card' in c.lower()]
+            if not card:
+                print("Kamera: kein Speicherkarten-Ziel in %s" % choices)
+                return
+            if node.get_value() != card[0]:
+                node.set_value(card[0])
+                camera.set_config(config)
+        except self.gp.GPhoto2Error as e:
+            print("Kamera: Aufnahmeziel nicht gesetzt (%s)" % e)
+
+    # nach einer Pause: kurze PTP-Abfrage, eine tote Verbindung wird geschlossen
+
+    def check(self):
+        if self.camera is None or self.clock() - self.t_used < IDLE:
+            return
+        self.checks = self.checks + 1
+        try:
+            self.camera.get_summary()
+        except self.gp.GPhoto2Error as e:
+            print("Kamera antwortet nicht (%s), neu verbinden..." % e)
+            self.reconnects = self.reconnects + 1
+            self.close()
+
+    #-------------------------------------------------------------------------
+    # one shot, saved to target
+    # returns the camera file path, raises gphoto2's error after RETRIES reconnects
+
+    def capture(self, target):
+        path = self.trigger()
+        st = self.last
+        self.fetch(path, target)
+        self.add(st['total_s'] + self.fetched['total_s'])
+        st['download_s'] = self.fetched['download_s']
+        st['total_s'] = st['total_s'] + self.fetched['total_s']
+        return path
+
+    # shutter release only, the file stays on the camera
+
+    def trigger(self):
+        gp = self.gp
+        t0 = self.clock()
+        tries = 0
+        while True:
+            try:
+                with self.lock:
+                    self.check()
+                    camera = self.open()
+                    t1 = self.clock()
+                    path = camera.capture(gp.GP_CAPTURE_IMAGE)
+                    t2 = self.clock()
+                break
+            except gp.GPhoto2Error as e:
+                tries = self.failed(e, tries)
+        self.t_used = self.clock()
+        self.last = {'total_s': self.clock() - t0, 'capture_s': t2 - t1, 'download_s': None, 'tries': tries + 1}
+        return path
+
+    # download and save of a shot, the file is written outside the lock
+
+    def fetch(self, path, target):
+        gp = self.gp
+        t0 = self.clock()
+        tries = 0
+        while True:
+            try:
+                with self.lock:
+                    camera = self.open()
+                    camera_file = camera.file_get(path.folder, path.name, gp.GP_FILE_TYPE_NORMAL)
+                    t1 = self.clock()
+                    self.t_used = t1
+                    if not self.pooled:
+                        self.close()
+                break
+            except gp.GPhoto2Error as e:
+                tries = self.failed(e, tries)
+        camera_file.save(target)
+        self.fetched = {'total_s': self.clock() - t0, 'download_s': t1 - t0, 'tries': tries + 1}
+
+    def failed(self, e, tries):
+        tries = tries + 1
+        with self.lock:
+            self.close()
+        if tries > RETRIES:
+            raise e
+        print("Kamerafehler (%s), neu verbinden..." % e)
+        self.reconnects = self.reconnects + 1
+        return tries
+
+    def add(self, total):
+        self.shots = self.shots + 1
+        self.sum_s = self.sum_s + total
+        self.max_s = max(self.max_s, total)
+
+    # live view frame (bytes), e.g. for the settle calibration
+
+    def preview(self):
+        with self.lock:
+            camera = self.open()
+            camera_file = camera.capture_preview()
+            self.t_used = self.clock()
+            return memoryview(camera_file.get_data_and_size()).tobytes()
+
+    #-------------------------------------------------------------------------
+    # event mode: release without waiting for the file, tag e.g. the position
+    # of the shot; the file arrives later as a FILE_ADDED event (EventWatcher)
+
+    def fire(self, target, tag=None, sleep=time.sleep):
+        gp = self.gp
+        t0 = self.clock()
+        busy = 0
+        tries = 0
+        while True:
+            try:
+                with self.lock:
+                    self.check()
+                    camera = self.open()
+                    camera.trigger_capture()
+                    self.fired.append((target, tag, self.clock()))
+                    self.released = self.released + 1
+                break
+            except gp.GPhoto2Error as e:
+                # die Kamera schreibt noch das letzte Bild
+                if e.code == gp.GP_ERROR_CAMERA_BUSY and busy < BUSY_TRIES:
+                    busy = busy + 1
+                    sleep(0.01)
+                    continue
+                tries = self.failed(e, tries)
+        self.t_used = self.clock()
+        self.last = {'total_s': self.clock() - t0, 'capture_s': self.clock() - t0, 'download_s': None,
+                     'tries': tries + 1}
+
+    #-------------------------------------------------------------------------
+    # card mode: the shot stays on the card until flush()
+
+    def defer(self, path, target):
+        self.pending.append((path, target))
+
+    # all deferred shots in one batch, returns their number
+
+    def flush(self):
+        n = 0
+        t = self.clock()
+        while self.pending:
+            path, target = self.pending.pop(0)
+            try:
+                self.fetch(path, target)
+                n = n + 1
+            except self.gp.GPhoto2Error as e:
+                self.lost = self.lost + 1
+                print("Bild %s/%s bleibt auf der Karte: %s" % (path.folder, path.name, e))
+        self.flushed = self.flushed + n
+        self.flush_s = self.flush_s + self.clock() - t
+        return n
+
+#-----------------------------------------------------------------------------
+# background download stage
+# size - bounded queue, put() waits when size shots are still pending
+
+class Downloader(object):
+
+    def __init__(self, session, size=4):
+        self.session = session
+        self.queue = queue.Queue(size)
+        self.done = 0
+        self.errors = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+        self.wait_s = 0.0
+        self.thread = threading.Thread(target=self.work, name="download")
+        self.thread.daemon = True
+        self.thread.start()
+
+    # shot after the shutter release, returns at once unless the queue is full
+
+    def put(self, path, target):
+        t = self.session.clock()
+        self.queue.put((path, target))
+        self.wait_s = self.wait_s + self.session.clock() - t
+
+    def work(self):
+        cs = self.session
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                path, target = item
+                cs.fetch(path, target)
+                self.done = self.done + 1
+                self.sum_s = self.sum_s + cs.fetched['total_s']
+                self.max_s = max(self.max_s, cs.fetched['total_s'])
+            except Exception as e:
+                self.errors = self.errors + 1
+                print("Bild %s nicht geladen: %s" % (item[1], e))
+            finally:
+                self.queue.task_done()
+
+    # wait until all pending shots are saved
+
+    def drain(self):
+        self.queue.join()
+
+    def close(self):
+        self.drain()
+        self.queue.put(None)
+        self.thread.join()
+
+#-----------------------------------------------------------------------------
+# camera events of event mode
+# files are matched in order to session.fired and handed to the downloader
+# (or deferred to flush() without one), matched - (camera path, target, tag, latency)
+# thread - poll in an own thread, else the caller calls poll() (simulator clock)
+
+class EventWatcher(object):
+
+    def __init__(self, session, downloader=None, thread=True):
+        self.session = session
+        self.downloader = downloader
+        self.matched = []
+        self.missed = 0
+        self.extra = 0
+        self.complete = 0
+        self.exposed_n = 0
+        self.assumed = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+        self.stem = None
+        self.running = True
+        self.thread = None
+        if thread:
+            self.thread = threading.Thread(target=self.work, name="events")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def work(self):
+        while self.running:
+            if not self.poll():
+                time.sleep(EVENT_MS / 1000.0)
+
+    # one event, False if there is no camera to ask
+    # (without a thread: also when the camera is busy with another call)
+
+    def poll(self):
+        cs = self.session
+        gp = cs.gp
+        ev = None
+        if not cs.lock.acquire(self.thread is not None):
+            return False
+        try:
+            if cs.camera is not None:
+                ev = cs.camera.wait_for_event(EVENT_MS)
+        except gp.GPhoto2Error as e:
+            print("Kamera-Ereignis: %s" % e)
+        finally:
+            cs.lock.release()
+        if ev is None:
+            self.expire()
+            return False
+        kind, data = ev
+        if kind == gp.GP_EVENT_FILE_ADDED:
+            self.added(data)
+        elif kind == gp.GP_EVENT_CAPTURE_COMPLETE:
+            self.completed()
+        else:
+            self.expire()
+        return True
+
+    def added(self, path):
+        cs = self.session
+        stem, ext = os.path.splitext(path.name)
+        if self.stem is not None and stem == self.stem[0]:
+            # zweite Datei derselben Aufnahme (RAW+JPEG)
+            target, tag = self.stem[1]
+            target = os.path.splitext(target)[0] + ext.lower()
+        elif cs.fired:
+            target, tag, t = cs.fired.pop(0)
+            lat = cs.clock() - t
+            self.sum_s = self.sum_s + lat
+            self.max_s = max(self.max_s, lat)
+            self.stem = (stem, (target, tag))
+            self.matched.append((path.folder + "/" + path.name, target, tag, lat))
+            self.done_with(len(self.matched) + self.missed)
+        else:
+            self.extra = self.extra + 1
+            print("Datei %s/%s ohne Ausloesung, bleibt auf der Karte" % (path.folder, path.name))
+            return
+        if self.downloader is not None:
+            self.downloader.put(path, target)
+        else:
+            cs.defer(path, target)
+
+    # shots without a file after LOST_S
+
+    def expire(self):
+        cs = self.session
+        while cs.fired and cs.clock() - cs.fired[0][2] > LOST_S:
+            target, tag, t = cs.fired.pop(0)
+            self.missed = self.missed + 1
+            self.done_with(len(self.matched) + self.missed)
+            print("Keine Datei fuer %s (%s)" % (target, tag))
+
+    # exposed_n - releases whose exposure is over, in release order
+    # CAPTURE_COMPLETE belongs to the oldest release still exposing, one without
+    # a release waiting (late from a shot given up) is dropped
+
+    def completed(self):
+        self.complete = self.complete + 1
+        if self.exposed_n < self.session.released:
+            self.exposed_n = self.exposed_n + 1
+
+    # the file (or giving it up) of release k ends its exposure too,
+    # for cameras without CAPTURE_COMPLETE
+
+    def done_with(self, k):
+        self.exposed_n = max(self.exposed_n, k)
+
+    def exposed(self):
+        return self.exposed_n
+
+    # wait until the first n releases are exposed, at most until deadline (the
+    # configured exposure time for cameras that report neither), False then;
+    # after the deadline they count as exposed, the next shot starts afresh
+
+    def wait_exposed(self, n, deadline, clock=time.time, sleep=time.sleep):
+        while self.exposed_n < n:
+            if clock() >= deadline:
+                self.assumed = self.assumed + 1
+                self.exposed_n = n
+                return False
+            sleep(0.01)
+        return True
+
+    # wait until every shot fired has its file, sleep lets a virtual clock run on
+
+    def drain(self, sleep=time.sleep):
+        cs = self.session
+        while cs.fired and self.running:
+            sleep(EVENT_MS / 1000.0)
+        if self.downloader is not None:
+            self.downloader.drain()
+
+    def close(self):
+        self.drain()
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+#-----------------------------------------------------------------------------
+# reports
+
+def shot_summary(st, later="Laden im Hintergrund"):
+    if st['download_s'] is None:
+        load = later
+    else:
+        load = "Laden %.2f s" % st['download_s']
+    return "Aufnahme %.2f s (Ausloesen %.2f s, %s%s)" % \
+        (st['total_s'], st['capture_s'], load,
+         ", %d Versuche" % st['tries'] if st['tries'] > 1 else "")
+
+def download_summary(dl):
+    if dl.done == 0 and dl.errors == 0:
+        return "Download: keine Bilder"
+    return "Download im Hintergrund: %d Bilder, im Mittel %.2f s (max. %.2f s), Warten auf die Schlange %.2f s, %d Fehler" % \
+        (dl.done, dl.sum_s / max(dl.done, 1), dl.max_s, dl.wait_s, dl.errors)
+
+def flush_summary(cs, n, secs):
+    s = "Von der Karte geladen: %d Bilder in %.2f s" % (n, secs)
+    if n > 0:
+        s = s + " (%.2f s je Bild)" % (secs / n)
+    if cs.lost > 0:
+        s = s + ", %d nur auf der Karte" % cs.lost
+    return s
+
+def event_summary(ew):
+    n = len(ew.matched)
+    if n == 0:
+        return "Ereignisse: keine Dateien"
+    return "Ereignisse: %d Dateien zugeordnet, Ausloesen bis Datei im Mittel %.2f s (max. %.2f s), " \
+           "%d ohne Datei, %d ohne Ausloesung, %d x Belichtungsende nach der Belichtungszeit angenommen" % \
+        (n, ew.sum_s / n, ew.max_s, ew.missed, ew.extra, ew.assumed)
+
+def summary(cs):
+    if cs.shots == 0:
+        return "Kamera: keine Aufnahmen"
+    mean = cs.sum_s / cs.shots
+    s = "Kamera: %d Aufnahmen, im Mittel %.2f s (max. %.2f s), %d x verbunden" % \
+        (cs.shots, mean, cs.max_s, cs.opens)
+    if cs.opens > 0:
+        s = s + " (init %.2f s)" % (cs.open_s / cs.opens)
+    if cs.closes > 0:
+        s = s + ", exit %.2f s" % (cs.close_s / cs.closes)
+    s = s + ", %d Pruefungen, %d Neuverbindungen" % (cs.checks, cs.reconnects)
+    if cs.pooled and cs.opens > 0 and cs.closes > 0:
+        # vorher zahlte jede Aufnahme init und exit
+        s = s + "; mit init/exit je Aufnahme ~%.2f s" % \
+            (mean + cs.open_s / cs.opens + cs.close_s / cs.closes - cs.open_s / cs.shots)
+    return s
@@ -0,0 +1,157 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : endstop monitoring, fotoendstop.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-15
+# Last modified : 2020-01-15
+#
+# Watches the endstop contact on the PCF8574 (P2, mask 0x04) without an
+# I2C read per step. Either the INT line of the PCF8574 raises an edge
+# callback or the contact is sampled in packets of at most stopdist steps.
+# Groessere Pakete nur mit freiem Weg aus einer Nullung dieser Sitzung.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+#-----------------------------------------------------------------------------
+# the endstop
+# bus - smbus.SMBus or FakeExpander, addr - i2c address, mask - input bit
+# stopdist - guaranteed stop distance, max. steps after the contact closed
+# int_pin - gpio bcm number wired to the PCF8574 INT output (None = polling)
+
+class Endstop(object):
+
+    def __init__(self, bus, addr, mask, stopdist, int_pin=None, gpio=None):
+        self.bus = bus
+        self.addr = addr
+        self.mask = mask
+        self.stopdist = stopdist
+        self.int_pin = int_pin
+        self.hit = False
+        if int_pin is not None:
+            if gpio is None:
+                import RPi.GPIO as gpio
+            gpio.setup(int_pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+            gpio.add_event_detect(int_pin, gpio.FALLING, callback=self.irq)
+
+    def read(self):
+        pins = self.bus.read_byte(self.addr)
+        return (pins & self.mask) != 0
+
+    # INT faellt bei jeder Eingangsaenderung, Lesen setzt es zurueck
+
+    def irq(self, channel=None):
+        self.hit = self.read()
+
+    def arm(self):
+        self.hit = self.read()
+
+    def triggered(self):
+        if self.int_pin is not None:
+            return self.hit
+        return self.read()
+
+    # steps until the next check
+    # clearance - steps that can be travelled before the contact can close (None = unknown)
+    # the backend may play one packet while the next is queued, so a packet is stopdist/2
+
+    def chunk(self, remaining, clearance=None):
+        n = max(1, self.stopdist // 2)
+        if clearance is not None and clearance > n:
+            n = clearance
+        return min(n, remaining)
+
+#-----------------------------------------------------------------------------
+# guarded move
+# send(start, n) outputs the steps start..start+n-1 of the move
+# maxchunk - upper limit of a packet, e.g. to keep the move cancellable
+# returns the number of steps handed to send
+
+def guarded(es, numsteps, send, clearance=None, maxchunk=None):
+    done = 0
+    es.arm()
+    while done < numsteps:
+        if es.triggered():
+            break
+        if clearance is None:
+            n = es.chunk(numsteps - done)
+        else:
+            n = es.chunk(numsteps - done, clearance - done)
+        if maxchunk is not None:
+            n = min(n, maxchunk)
+        send(done, n)
+        done = done + n
+    return done
+
+#-----------------------------------------------------------------------------
+# fake bus test harness
+# PCF8574 with I2C transaction counters, doubles as GPIO module for the INT line
+
+class FakeExpander(object):
+
+    IN = 1
+    PUD_UP = 22
+    FALLING = 32
+
+    def __init__(self, pins=0x00):
+        self.pins = pins
+        self.reads = 0
+        self.writes = 0
+        self.callback = None
+
+    def read_byte(self, addr):
+        self.reads = self.reads + 1
+        return self.pins
+
+    def write_byte(self, addr, val):
+        self.writes = self.writes + 1
+
+    def setup(self, pin, mode, pull_up_down=None):
+        pass
+
+    def add_event_detect(self, pin, edge, callback=None):
+        self.callback = callback
+
+    def set_input(self, pins):
+        changed = pins != self.pins
+        self.pins = pins
+        if changed and self.callback is not None:
+            self.callback(0)
+
+#-----------------------------------------------------------------------------
+# count I2C transactions per move: python fotoendstop.py
+
+def harness(numsteps, trip_at, stopdist, interrupt, clearance=None):
+    fake = FakeExpander()
+    if interrupt:
+        es = Endstop(fake, 0x20, 0x04, stopdist, 0, fake)
+    else:
+        es = Endstop(fake, 0x20, 0x04, stopdist)
+    state = {'pos': 0}
+
+    def send(start, n):
+        for i in range(n):
+            state['pos'] = state['pos'] + 1
+            if trip_at is not None and state['pos'] == trip_at:
+                fake.set_input(0x04)
+
+    done = guarded(es, numsteps, send, clearance)
+    over = 0
+    if trip_at is not None and done >= trip_at:
+        over = done - trip_at
+    return done, fake.reads, over
+
+if __name__ == "__main__":
+    print("Nullung 27000 Schritte, Endstop bei Schritt 20000")
+    print("  alt (jeder Schritt)   : %d I2C-Zugriffe" % 20000)
+    for interrupt in (False, True):
+        done, reads, over = harness(27000, 20000, 16, interrupt)
+        print("  %-22s: %d I2C-Zugriffe, %d Schritte, Ueberlauf %d" %
+              ("Interrupt" if interrupt else "Polling (16 Schritte)", reads, done, over))
+    done, reads, over = harness(24600, None, 16, False, 24000)
+    print("Fahrt 24600 Schritte, 24000 Schritte frei: %d I2C-Zugriffe" % reads)
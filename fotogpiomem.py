@@ -0,0 +1,140 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : gpio register backend, fotogpiomem.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-28
+# Last modified : 2020-01-28
+#
+# Maps the GPIO registers of the BCM283x via /dev/gpiomem (no root needed,
+# user in group gpio) and writes the pin masks of a bank write straight
+# into GPSET0/GPCLR0, one 32 bit store each, no system call per edge.
+# Any other path is taken as a file-backed fake register page for tests
+# off the Pi; the fake keeps the resulting pin levels in GPLEV0.
+#
+#   FOTO_PULSE=mem python foto.py
+#   python fotogpiomem.py        step rates mem against RPi.GPIO
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import os
+import mmap
+import time
+import numpy as np
+
+import fotopulse
+
+DEVICE = "/dev/gpiomem"
+
+# Registeroffsets in 32 bit Worten (Byteoffset / 4)
+GPFSEL0 = 0x00 // 4
+GPSET0 = 0x1C // 4
+GPCLR0 = 0x28 // 4
+GPLEV0 = 0x34 // 4
+
+PAGE = 4096
+
+#-----------------------------------------------------------------------------
+# fake register page, a file of one page with zeros
+
+def fake_page(path):
+    with open(path, "wb") as f:
+        f.write(b"\0" * PAGE)
+    return path
+
+#-----------------------------------------------------------------------------
+# the register backend, plays waveforms like the RPi.GPIO backend
+
+class MemBackend(fotopulse.GpioBackend):
+
+    name = "mem"
+
+    def __init__(self, path=DEVICE):
+        self.path = path
+        self.fake = path != DEVICE
+        self.fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        self.mm = mmap.mmap(self.fd, PAGE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        # als uint32-Feld: jede Zuweisung ist ein 32-Bit-Zugriff
+        self.regs = np.frombuffer(self.mm, dtype=np.uint32)
+        self.t_end = None
+        self.log = None
+        self.comp = 0.0
+        self.writes = 0
+
+    # Funktion je Pin: 3 Bit in GPFSELn, 001 = Ausgang
+
+    def setup(self, pins):
+        for pin in pins:
+            reg = GPFSEL0 + pin // 10
+            shift = (pin % 10) * 3
+            self.regs[reg] = (int(self.regs[reg]) & ~(7 << shift)) | (1 << shift)
+            self.bank(0, 1 << pin)
+
+    def write(self, pin, level):
+        if level:
+            self.bank(1 << pin, 0)
+        else:
+            self.bank(0, 1 << pin)
+
+    def bank(self, set_mask, clear_mask):
+        regs = self.regs
+        if set_mask:
+            regs[GPSET0] = set_mask
+        if clear_mask:
+            regs[GPCLR0] = clear_mask
+        if self.fake:
+            regs[GPLEV0] = (int(regs[GPLEV0]) | set_mask) & ~clear_mask
+        self.writes = self.writes + 1
+
+    def level(self, pin):
+        return (int(self.regs[GPLEV0]) >> pin) & 1
+
+    def cleanup(self):
+        del self.regs
+        self.mm.close()
+        os.close(self.fd)
+
+#-----------------------------------------------------------------------------
+# step rate benchmark: python fotogpiomem.py
+# writes the edges of a step train back to back, the rate is what the output path allows
+
+def rate(backend, pins, steps=20000):
+    wave = fotopulse.compile_train([pins] * steps, 1, 1)
+    groups = wave.groups()
+    t = time.time()
+    for off, on_mask, off_mask in groups:
+        backend.bank(on_mask, off_mask)
+    return steps / (time.time() - t)
+
+def bench():
+    pins = [5, 6]
+    print("Bankschreibzugriffe ohne Wartezeit, 20000 Schritte MX+MY")
+    if os.path.exists(DEVICE):
+        mem = MemBackend()
+        mem.setup(pins)
+        print("  /dev/gpiomem : %8.0f Schritte/s" % rate(mem, pins))
+        mem.cleanup()
+    else:
+        import tempfile
+        path = fake_page(os.path.join(tempfile.mkdtemp(prefix="fotogpio"), "gpiomem"))
+        mem = MemBackend(path)
+        mem.setup(pins)
+        print("  Fake-Datei   : %8.0f Schritte/s (kein /dev/gpiomem)" % rate(mem, pins))
+        print("  Pegel MX/MY  : %d/%d, GPFSEL0 %08x" % (mem.level(5), mem.level(6), int(mem.regs[GPFSEL0])))
+        mem.cleanup()
+    try:
+        gpio = fotopulse.GpioBackend()
+    except (ImportError, RuntimeError):
+        print("  RPi.GPIO     : nicht verfuegbar")
+        return
+    gpio.setup(pins)
+    print("  RPi.GPIO     : %8.0f Schritte/s" % rate(gpio, pins))
+    gpio.cleanup()
+
+if __name__ == "__main__":
+    bench()
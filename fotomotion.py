@@ -0,0 +1,77 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : motion engine, fotomotion.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-16
+# Last modified : 2020-01-16
+#
+# N-axis line interpolation (DDA/Bresenham) for MX/MY/MZ/MA. A move is
+# turned into one merged stream of step masks, one entry per tick, with
+# exact endpoint counts on every axis.
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import numpy as np
+
+from fotopulse import mask_pins
+
+#-----------------------------------------------------------------------------
+# the dda routine
+# counts - steps per axis, e.g. {0: 24600, 1: 800}
+# bits - mask bit per axis, e.g. {0: 1 << 5, 1: 1 << 6}
+# returns an int64 array with the step mask of every tick,
+# the axis with the most steps steps on every tick
+
+def dda(counts, bits):
+    lead = max(counts.values()) if counts else 0
+    return dda_at(counts, bits, 0, lead)
+
+# the masks of the ticks k0 .. k1-1 only, the accumulator is computed, not carried
+
+def dda_at(counts, bits, k0, k1):
+    lead = max(counts.values()) if counts else 0
+    k1 = min(k1, lead)
+    if k1 <= k0:
+        return np.zeros(0, dtype=np.int64)
+    masks = np.zeros(k1 - k0, dtype=np.int64)
+    k = np.arange(k0, k1 + 1, dtype=np.int64)
+    for mot, n in counts.items():
+        if n <= 0:
+            continue
+        # Bresenham: Achse steppt, wenn floor((k*n + lead/2) / lead) weiterzaehlt
+        acc = (k * n + lead // 2) // lead
+        stepped = np.diff(acc) > 0
+        masks[stepped] |= bits[mot]
+    return masks
+
+# tick of the nth step (1 ..) of an axis with n steps, inverse of the accumulator
+
+def step_tick(n, lead, nth):
+    return -((lead // 2 - nth * lead) // n) - 1
+
+#-----------------------------------------------------------------------------
+# masks to pin lists, e.g. for fotopulse.compile_timed
+
+def ticks(masks):
+    table = {}
+    res = []
+    for m in masks.tolist():
+        if m not in table:
+            table[m] = mask_pins(m)
+        res.append(table[m])
+    return res
+
+#-----------------------------------------------------------------------------
+# P5 check: python fotomotion.py
+
+if __name__ == "__main__":
+    masks = dda({0: 24600, 1: 800}, {0: 1 << 5, 1: 1 << 6})
+    print("P5: %d Ticks, MX %d Schritte, MY %d Schritte (alt: MY %d)" %
+          (len(masks), np.count_nonzero(masks & (1 << 5)), np.count_nonzero(masks & (1 << 6)),
+           24600 // (24600 // 800)))
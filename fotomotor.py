@@ -0,0 +1,674 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : motion control, fotomotor.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-29
+# Last modified : 2020-01-29
+#
+# Motion runs the moves: compile (with the step plan cache), direction
+# pins, waveform packets with endstop guard and emergency stop, position
+# bookkeeping and step log. It lives in foto.py's process or, with
+# FOTO_MOTION=proc, in a motion process of its own: MotionProc writes
+# the moves into a shared memory command ring and reads progress, result
+# and position from a shared status block. Tk, PIL and gphoto2 then
+# share no interpreter (and no GIL) with the step output.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import math
+import time
+import ctypes
+import signal
+import struct
+import traceback
+import multiprocessing
+import numpy as np
+
+import fotopulse
+import fotoprofile
+import fotomotion
+import fotoendstop
+import fotoplan
+import fotoaim
+import fotostop
+import fotostream
+import fototiming
+
+#-----------------------------------------------------------------------------
+# the motion engine
+# pulse - backend (see fotopulse.py), gpio/en - enable pin, cpins/dpins - step/direction pins
+# estop - EStop or SharedStop, stepcache - StepCache or None
+# home/emargin - MX home position left of the endstop and its tolerance (steps)
+# cstep - ticks between endstop checks without guard, packet_ms - max. packet length
+# pulse_us - step pulse width, shape - trap or scurve, logpath - step log file
+# frame_ms - velocity window of the ripple report of video moves (one frame at 25 fps)
+
+class Motion(object):
+
+    def __init__(self, pulse, gpio, en, cpins, dpins, endstop, position, steplog, estop, stepcache=None,
+                 home=400, emargin=200, cstep=400, packet_ms=25, pulse_us=50, shape="trap", logpath=None,
+                 frame_ms=40):
+        self.pulse = pulse
+        self.gpio = gpio
+        self.en = en
+        self.cpins = cpins
+        self.dpins = dpins
+        self.endstop = endstop
+        self.position = position
+        self.steplog = steplog
+        self.estop = estop
+        self.stepcache = stepcache
+        self.home = home
+        self.emargin = emargin
+        self.cstep = cstep
+        self.packet_ms = packet_ms
+        self.pulse_us = pulse_us
+        self.shape = shape
+        self.logpath = logpath
+        self.frame_ms = frame_ms
+        self.aimq = None
+        # letzte Fahrt: Endstop erreicht, Schritte je Achse (mit Vorzeichen), Dauer
+        self.stopped = False
+        self.steps = [0] * len(cpins)
+        self.last_us = 0
+
+    #-------------------------------------------------------------------------
+    # step plan of a run (fotostream.StreamPlan or, from the cache, ArrayPlan)
+    # segs - list of (moves, speed), moves like stepn(); blended when more than one
+    # name - program name for the step plan cache, None = not cached, streamed in chunks
+    # secs - video move: one segment at constant speed, secs long
+
+    def compile(self, segs, force, name=None, secs=None):
+        run = fotoplan.Run(force)
+        for moves, speed in segs:
+            counts = dict((mot, n) for mot, d, n in moves if n > 0)
+            dirs = dict((mot, d) for mot, d, n in moves if n > 0)
+            if counts:
+                run.add(moves, counts, dirs, speed)
+        if not run.segs:
+            return None
+        fotoplan.junctions(run)
+        bits = dict((mot, 1 << self.cpins[mot]) for mot in run.dirs)
+        plan = fotostream.StreamPlan(run, bits, self.shape, secs=secs)
+        if name is not None and self.stepcache is not None:
+            params = [[m for m, s in segs], [s for m, s in segs], self.shape, self.cpins,
+                      sorted(fotoprofile.AXES.items())]
+            if secs is not None:
+                params.append(secs)
+            masks, periods = self.stepcache.get(name, params, plan.arrays)
+            plan = fotostream.ArrayPlan(masks, periods, bits, cruise=plan.cruise, ramps=plan.ramps)
+        counts, dirs = run.totals()
+        return counts, dirs, bits, plan
+
+    #-------------------------------------------------------------------------
+    # the move routine
+    # labels/show - display updates (tick, str1, str2) passed on the fly, show(str1, str2)
+    # check - cancel point before every packet, progress(ticks) - after every packet
+    # stopdist - endstop stop distance for this move (None = as configured)
+    # secs - video move of exactly secs seconds at constant speed (None = as fast as allowed)
+    # returns the number of ticks done, raises fotostop.Stopped after an emergency stop
+
+    def move(self, segs, force, name=None, labels=(), show=None, check=None, stopdist=None, progress=None,
+             secs=None):
+        dirs = {}
+        for moves, speed in segs:
+            for mot, dir, numsteps in moves:
+                dirs[mot] = dir
+        self.direction(dirs)
+
+        self.stopped = False
+        self.steps = [0] * len(self.cpins)
+        self.last_us = 0
+        c = self.compile(segs, force, name, secs)
+        if c is None:
+            return 0
+        counts, dirs, bits, plan = c
+
+        old = self.endstop.stopdist
+        if stopdist is not None:
+            self.endstop.stopdist = stopdist
+        try:
+            return self.steprun(counts, dirs, bits, plan, force, [m for m, s in segs],
+                                labels, show, check, progress, secs)
+        finally:
+            self.endstop.stopdist = old
+
+    # Richtungen aller angegebenen Achsen, auch ohne Schritte, in einem Schreibzugriff
+
+    def direction(self, dirs):
+        dset = 0
+        dclr = 0
+        for mot, dir in dirs.items():
+            if dir == 1:
+                dset |= 1 << self.dpins[mot]
+            else:
+                dclr |= 1 << self.dpins[mot]
+        self.pulse.bank(dset, dclr)
+
+    #-------------------------------------------------------------------------
+    # subject tracking move (see fotoaim.py): MX steps a .. b-1 of a move of nx steps,
+    # MY follows the subject at dist_mm/offset_mm, both from one mask stream
+    # returns the number of ticks done like move()
+
+    def aim(self, nx, dirx, dist_mm, offset_mm, a, b, force, speed=1, check=None, progress=None):
+        key = (nx, dist_mm, offset_mm)
+        if self.aimq is None or self.aimq[0] != key:
+            self.aimq = (key, fotoaim.schedule(nx, dist_mm, offset_mm))
+        q = self.aimq[1]
+        diry = fotoaim.pan_dir(dirx)
+        self.direction({0: dirx, 1: diry})
+        self.stopped = False
+        self.steps = [0] * len(self.cpins)
+        self.last_us = 0
+        if b <= a:
+            return 0
+        bits = {0: 1 << self.cpins[0], 1: 1 << self.cpins[1]}
+        masks = fotoaim.masks(q, a, b, bits[0], bits[1])
+        if masks is None:
+            print("Ziel zu nah: MY braucht mehr als einen Schritt je MX-Schritt.")
+            return 0
+        ny = int(q[b] - q[a])
+        # Grenzen nach der steilsten Stelle, nicht nach dem Mittel
+        r = fotoaim.peak_ratio(a, b, dist_mm, offset_mm)
+        vmax, amax, vstart = fotoprofile.limits_n({0: b - a, 1: max(int(math.ceil(r * (b - a))), ny)}, speed)
+        periods = fotoprofile.profile(b - a, vmax, amax, vstart, self.shape)
+        counts = {0: b - a}
+        dirs = {0: dirx}
+        if ny > 0:
+            counts[1] = ny
+            dirs[1] = diry
+        plan = fotostream.ArrayPlan(masks, periods, bits)
+        return self.steprun(counts, dirs, bits, plan, force, [[(0, dirx, b - a), (1, diry, ny)]],
+                            (), None, check, progress)
+
+    def steprun(self, counts, dirs, bits, plan, force, moves, labels, show, check, progress, secs=None):
+        pulse = self.pulse
+        endstop = self.endstop
+        position = self.position
+        estop = self.estop
+        steplog = self.steplog
+
+        self.gpio.output(self.en, False)
+
+        labels = list(labels)
+        total = plan.ticks
+        reader = fotostream.Reader(plan)
+        clr = None
+        if force == 0:
+            clr = self.clearance(counts, dirs, plan)
+
+        # sent - ticks handed to the backend, check() is the cancel point
+        # booked - steps per axis sent so far, sent_us - their duration
+        # brake - ticks and duration of the braking ramp after an emergency stop
+        sent = [0]
+        sent_us = [0]
+        booked = dict((mot, 0) for mot in counts)
+        brake = [None]
+
+        def out(masks, periods):
+            pulse.send(fotopulse.compile_timed(fotomotion.ticks(masks), periods, self.pulse_us))
+            steplog.plan(periods)
+            for mot in counts:
+                booked[mot] = booked[mot] + int(np.count_nonzero(masks & bits[mot]))
+            sent[0] = sent[0] + len(masks)
+            sent_us[0] = sent_us[0] + int(np.sum(periods))
+
+        def send(start, n):
+            end = start + n
+            while sent[0] < end:
+                if estop.is_set():
+                    halt()
+                if check is not None:
+                    check()
+                # Pakete von hoechstens packet_ms, damit der Not-Halt schnell greift
+                masks, periods = reader.take(end - sent[0], self.packet_ms * 1000)
+                if len(masks) == 0:
+                    break
+                out(masks, periods)
+                if progress is not None:
+                    progress(sent[0])
+                while labels and labels[0][0] < sent[0]:
+                    t, str1, str2 = labels.pop(0)
+                    if show is not None:
+                        show(str1, str2)
+
+        # Not-Halt: entlang der Bahn bis vstart abbremsen, Richtung Endstop hoechstens bis zur Freistrecke
+        def halt():
+            start = sent[0]
+            v = 0.0
+            if start > 0:
+                v = 1000000.0 / reader.last
+            vmax, amax, vstart = fotoprofile.limits_n(counts)
+            per = fotoprofile.stop_profile(v, amax, vstart, self.shape)
+            n = min(len(per), total - start)
+            if force == 0:
+                if clr is None:
+                    n = min(n, endstop.stopdist)
+                else:
+                    n = min(n, max(clr - start, endstop.stopdist))
+            us = sent_us[0]
+            k = 0
+            while k < n:
+                masks, periods = reader.take(n - k)
+                if len(masks) == 0:
+                    break
+                out(masks, np.maximum(per[k:k + len(masks)], periods))
+                k = k + len(masks)
+            brake[0] = (k, sent_us[0] - us)
+            raise fotostop.Stopped()
+
+        position.begin()
+        self.steplog.begin()
+        stopped = False
+
+        try:
+            if force == 0:
+                # nie mehr als EMARGIN Schritte am Stueck, falls die Position doch daneben liegt
+                done = fotoendstop.guarded(endstop, total, send, clr, min(self.cstep, self.emargin))
+                stopped = done < total
+
+            if force == 1:
+                done = 0
+                while done < total:
+                    n = min(self.cstep, total - done)
+                    send(done, n)
+                    done = done + n
+        finally:
+            pulse.flush()
+            self.gpio.output(self.en, True)
+
+            # Position nachfuehren, Endstop in Richtung rechts setzt die X-Referenz
+            done = sent[0]
+            for mot in counts:
+                steps = booked[mot]
+                if dirs[mot] == 1:
+                    self.steps[mot] = steps
+                else:
+                    self.steps[mot] = -steps
+                position.moved(mot, self.steps[mot])
+            if stopped and dirs.get(0) == 0:
+                position.reference(0, -self.home)
+            position.end()
+            self.stopped = stopped
+
+            st = steplog.end()
+            if brake[0] is not None:
+                st['estop'] = estop.halted(brake[0][1], brake[0][0])
+                print(fotostop.summary(st['estop']))
+            self.last_us = sent_us[0]
+            if plan.cruise is not None and done > 0:
+                # Gleichlauf im Fahrtabschnitt konstanter Geschwindigkeit, Fenster ein Filmbild
+                v = plan.ramps[3]
+                vd = steplog.ripple(plan.cruise[0], plan.cruise[1], v * self.frame_ms / 1000.0) or {}
+                vd['secs'] = secs
+                vd['real_s'] = st.get('duration_ms', 0.0) / 1000.0 + reader.last / 1000000.0
+                st['video'] = vd
+                print(fototiming.video_summary(vd))
+            st['moves'] = moves
+            if self.logpath is not None:
+                steplog.write(self.logpath, st)
+            print(fototiming.summary(st))
+
+        if not stopped and show is not None:
+            for t, str1, str2 in labels:
+                show(str1, str2)
+
+        return done
+
+    #-------------------------------------------------------------------------
+    # single steps at the caller's time (tracking), at vstart, no step log
+    # n - steps of axis mot in direction dir (0 = none), hold - drivers stay enabled afterwards
+
+    def step(self, mot, dir, n=1, hold=True):
+        self.steps = [0] * len(self.cpins)
+        self.last_us = 0
+        if n > 0:
+            dp = 1 << self.dpins[mot]
+            if dir == 1:
+                self.pulse.bank(dp, 0)
+            else:
+                self.pulse.bank(0, dp)
+            self.gpio.output(self.en, False)
+            period = int(1000000.0 / fotoprofile.AXES[mot]['vstart'])
+            self.pulse.send(fotopulse.compile_timed([[self.cpins[mot]]] * n, [period] * n, self.pulse_us))
+            self.pulse.flush()
+            self.steps[mot] = n if dir == 1 else -n
+            self.last_us = period * n
+            self.position.begin()
+            self.position.moved(mot, self.steps[mot])
+            self.position.end()
+        self.gpio.output(self.en, not hold)
+
+    #-------------------------------------------------------------------------
+    # ticks that can be stepped before the endstop may close (None = unknown)
+
+    def clearance(self, counts, dirs, plan):
+        position = self.position
+        if counts.get(0, 0) <= 0 or dirs[0] == 1:
+            return plan.ticks
+        # nur nach einer Nullung in dieser Sitzung, die Datei kann veraltet sein
+        if position.need_home(0) or not position.checked[0]:
+            return None
+        free = position.pos[0] + self.home - self.emargin
+        if free <= 0:
+            return 0
+        # Tick des free-ten MX-Schritts
+        t = plan.step_tick(0, free)
+        if t is None:
+            return plan.ticks
+        return t + 1
+
+#-----------------------------------------------------------------------------
+# shared memory layout of the motion process
+
+# command ring, one slot per segment of a run (more = 1: the run continues in the next slot)
+# op, seq, more, force, speed in 1/1000, stopdist (0 = as configured), name (16 bytes), steps[4], dirs[4],
+# video duration in ms (0 = none)
+SLOTS = 64
+SLOTW = 17
+OP_MOVE = 1
+OP_QUIT = 2
+OP_STEP = 3     # single steps: force = hold, speed = n, steps/dirs of the axis
+OP_AIM = 4      # subject tracking: force, speed, from word 8 nx, dirx, dist and offset in um, a, b
+
+# status block
+S_READY = 0
+S_SEQ = 1       # last finished run
+S_RESULT = 2
+S_DONE = 3      # ticks done
+S_SENT = 4      # ticks handed to the backend so far (progress)
+S_STOP = 5      # stop request of the parent
+S_TSTOP = 6     # its wall time in microseconds
+S_LAST_US = 7   # duration of the last run
+S_NEED = 8      # bit per axis: homing due
+S_POS = 12
+S_KNOWN = 16
+S_TRAVEL = 20
+S_STEPS = 24    # steps per axis of the last run
+S_SIZE = 28
+
+RES_OK = 0
+RES_ENDSTOP = 1
+RES_ESTOP = 2
+RES_ERROR = 3
+
+NAXES = 4
+
+def pack_name(name):
+    return struct.unpack("<2q", (name or "").encode("ascii")[:16].ljust(16, b"\0"))
+
+def unpack_name(a, b):
+    name = struct.pack("<2q", a, b).rstrip(b"\0").decode("ascii")
+    return name or None
+
+#-----------------------------------------------------------------------------
+# emergency stop flag in the status block, for the Motion in the motion process
+# the request is stamped with the wall clock, clock - time source of the measurement
+
+class SharedStop(object):
+
+    def __init__(self, st, clock=time.time):
+        self.st = st
+        self.clock = clock
+        self.source = "Motion-Prozess"
+        self.t_req = None
+
+    def trigger(self, source):
+        self.st[S_TSTOP] = int(time.time() * 1000000)
+        self.st[S_STOP] = 1
+        self.source = source
+
+    def is_set(self):
+        if self.st[S_STOP] == 0:
+            return False
+        if self.t_req is None:
+            self.t_req = self.clock() - max(time.time() - self.st[S_TSTOP] / 1000000.0, 0.0)
+        return True
+
+    def halted(self, decel_us, steps):
+        stop_ms = (self.clock() - self.t_req) * 1000.0
+        return {'source': self.source, 'stop_ms': stop_ms, 'steps': steps,
+                'decel_ms': decel_us / 1000.0, 'react_ms': max(stop_ms - decel_us / 1000.0, 0.0)}
+
+#-----------------------------------------------------------------------------
+# the motion process
+# make(stop) - builds the Motion, called in the motion process
+
+def publish(motion, st):
+    pos = motion.position
+    need = 0
+    for mot in range(NAXES):
+        st[S_POS + mot] = pos.pos[mot]
+        st[S_KNOWN + mot] = 1 if pos.known[mot] else 0
+        st[S_TRAVEL + mot] = pos.travel[mot]
+        st[S_STEPS + mot] = motion.steps[mot]
+        if pos.need_home(mot):
+            need |= 1 << mot
+    st[S_NEED] = need
+
+def serve(make, ring, st, items, space, done):
+    # Strg-C und SIGUSR1 gehen an foto.py, das den Stopp hierher meldet
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    stop = SharedStop(st)
+    motion = make(stop)
+    publish(motion, st)
+    st[S_READY] = 1
+    done.release()
+
+    tail = 0
+    segs = []
+
+    def progress(n):
+        st[S_SENT] = n
+
+    while True:
+        items.acquire()
+        i = (tail % SLOTS) * SLOTW
+        slot = list(ring[i:i + SLOTW])
+        tail = tail + 1
+        space.release()
+        op, seq, more, force, speed, stopdist = slot[:6]
+        if op == OP_QUIT:
+            break
+        if op == OP_STEP:
+            mot = [m for m in range(NAXES) if slot[8 + m] >= 0][0]
+            res = RES_OK
+            try:
+                motion.step(mot, slot[12 + mot], speed, force != 0)
+            except Exception:
+                traceback.print_exc()
+                res = RES_ERROR
+            st[S_LAST_US] = motion.last_us
+            st[S_RESULT] = res
+            publish(motion, st)
+            st[S_SEQ] = seq
+            done.release()
+            continue
+        if op == OP_AIM:
+            nx, dirx, dist, off, a, b = slot[8:14]
+            stop.t_req = None
+            st[S_SENT] = 0
+            res = RES_OK
+            n = 0
+            try:
+                n = motion.aim(nx, dirx, dist / 1000.0, off / 1000.0, a, b, force, speed / 1000.0, progress=progress)
+                if motion.stopped:
+                    res = RES_ENDSTOP
+            except fotostop.Stopped:
+                res = RES_ESTOP
+            except Exception:
+                traceback.print_exc()
+                res = RES_ERROR
+            st[S_DONE] = n
+            st[S_LAST_US] = motion.last_us
+            st[S_RESULT] = res
+            publish(motion, st)
+            st[S_SEQ] = seq
+            done.release()
+            continue
+        moves = [(mot, slot[12 + mot], slot[8 + mot]) for mot in range(NAXES) if slot[8 + mot] >= 0]
+        segs.append((moves, speed / 1000.0))
+        if more:
+            continue
+
+        stop.t_req = None
+        st[S_SENT] = 0
+        res = RES_OK
+        n = 0
+        try:
+            n = motion.move(segs, force, unpack_name(slot[6], slot[7]), stopdist=stopdist or None, progress=progress,
+                            secs=slot[16] / 1000.0 if slot[16] else None)
+            if motion.stopped:
+                res = RES_ENDSTOP
+        except fotostop.Stopped:
+            res = RES_ESTOP
+        except Exception:
+            traceback.print_exc()
+            res = RES_ERROR
+        segs = []
+        st[S_DONE] = n
+        st[S_LAST_US] = motion.last_us
+        st[S_RESULT] = res
+        publish(motion, st)
+        st[S_SEQ] = seq
+        done.release()
+
+#-----------------------------------------------------------------------------
+# position as published by the motion process (read only)
+
+class PositionView(object):
+
+    def __init__(self, st):
+        self.st = st
+
+    @property
+    def pos(self):
+        return [int(v) for v in self.st[S_POS:S_POS + NAXES]]
+
+    @property
+    def known(self):
+        return [v != 0 for v in self.st[S_KNOWN:S_KNOWN + NAXES]]
+
+    @property
+    def travel(self):
+        return [int(v) for v in self.st[S_TRAVEL:S_TRAVEL + NAXES]]
+
+    def need_home(self, mot):
+        return (self.st[S_NEED] >> mot) & 1 != 0
+
+#-----------------------------------------------------------------------------
+# the parent side, same move() as Motion
+# poll - seconds between looks at check() and the progress while a run plays
+
+class MotionProc(object):
+
+    def __init__(self, make, poll=0.005):
+        if hasattr(multiprocessing, 'get_context'):
+            mp = multiprocessing.get_context('fork')
+        else:
+            mp = multiprocessing
+        self.ring = mp.RawArray(ctypes.c_int64, SLOTS * SLOTW)
+        self.st = mp.RawArray(ctypes.c_int64, S_SIZE)
+        self.items = mp.Semaphore(0)
+        self.space = mp.Semaphore(SLOTS)
+        self.done = mp.Semaphore(0)
+        self.poll = poll
+        self.head = 0
+        self.seq = 0
+        self.position = PositionView(self.st)
+        self.proc = mp.Process(target=serve, name="motion",
+                               args=(make, self.ring, self.st, self.items, self.space, self.done))
+        self.proc.daemon = True
+        self.proc.start()
+        self.done.acquire()
+        self.stopped = False
+        self.steps = [0] * NAXES
+        self.last_us = 0
+
+    def post(self, slot):
+        self.space.acquire()
+        i = (self.head % SLOTS) * SLOTW
+        self.ring[i:i + SLOTW] = slot
+        self.head = self.head + 1
+        self.items.release()
+
+    def move(self, segs, force, name=None, labels=(), show=None, check=None, stopdist=None, progress=None,
+             secs=None):
+        st = self.st
+        self.seq = self.seq + 1
+        st[S_STOP] = 0
+        n0, n1 = pack_name(name)
+        for k, (moves, speed) in enumerate(segs):
+            slot = [OP_MOVE, self.seq, 1 if k + 1 < len(segs) else 0, force, int(round(speed * 1000)),
+                    stopdist or 0, n0, n1] + [-1] * NAXES + [0] * NAXES + [int(round((secs or 0) * 1000))]
+            for mot, dir, numsteps in moves:
+                slot[8 + mot] = numsteps
+                slot[12 + mot] = dir
+            self.post(slot)
+        return self.wait(labels, show, check, progress)
+
+    def aim(self, nx, dirx, dist_mm, offset_mm, a, b, force, speed=1, check=None, progress=None):
+        self.seq = self.seq + 1
+        self.st[S_STOP] = 0
+        slot = [OP_AIM, self.seq, 0, force, int(round(speed * 1000)), 0, 0, 0,
+                nx, dirx, int(round(dist_mm * 1000)), int(round(offset_mm * 1000)), a, b, 0, 0, 0]
+        self.post(slot)
+        return self.wait((), None, check, progress)
+
+    # warten, dabei Abbruch weitermelden und Anzeigen nachfuehren
+
+    def wait(self, labels, show, check, progress):
+        st = self.st
+        labels = list(labels)
+        err = None
+        while not self.done.acquire(True, self.poll):
+            if err is None and check is not None:
+                try:
+                    check()
+                except Exception as e:
+                    err = e
+                    st[S_TSTOP] = int(time.time() * 1000000)
+                    st[S_STOP] = 1
+            sent = st[S_SENT]
+            if progress is not None:
+                progress(sent)
+            while labels and labels[0][0] < sent:
+                t, str1, str2 = labels.pop(0)
+                if show is not None:
+                    show(str1, str2)
+
+        res = st[S_RESULT]
+        self.stopped = res == RES_ENDSTOP
+        self.steps = [int(v) for v in st[S_STEPS:S_STEPS + NAXES]]
+        self.last_us = st[S_LAST_US]
+        if err is not None:
+            raise err
+        if res == RES_ESTOP:
+            raise fotostop.Stopped()
+        if res == RES_ERROR:
+            print("Fehler im Motion-Prozess.")
+        if res == RES_OK and show is not None:
+            for t, str1, str2 in labels:
+                show(str1, str2)
+        return st[S_DONE]
+
+    def step(self, mot, dir, n=1, hold=True):
+        self.seq = self.seq + 1
+        slot = [OP_STEP, self.seq, 0, 1 if hold else 0, n, 0, 0, 0] + [-1] * NAXES + [0] * NAXES + [0]
+        slot[8 + mot] = n
+        slot[12 + mot] = dir
+        self.post(slot)
+        self.done.acquire()
+        self.steps = [int(v) for v in self.st[S_STEPS:S_STEPS + NAXES]]
+        self.last_us = self.st[S_LAST_US]
+
+    def close(self):
+        self.post([OP_QUIT] + [0] * (SLOTW - 1))
+        self.proc.join(1.0)
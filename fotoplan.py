@@ -0,0 +1,191 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : move sequence planner, fotoplan.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-25
+# Last modified : 2020-01-25
+#
+# A program is a list of moves, display updates, shots and dwells.
+# Consecutive moves without a stop between them are joined into one run
+# and blended through junction speeds (lookahead over the whole run),
+# every shot and dwell stops the axes as before.
+# In P7-P9 endet jede Fahrt an einer Aufnahme, dort wird nichts verschliffen.
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import math
+
+import fotoprofile
+import fotostream
+
+#-----------------------------------------------------------------------------
+# program items
+# ('move', moves, speed, force) - moves like stepn(): list of (mot, dir, numsteps)
+# ('show', str1, str2)          - display update, passed on the fly inside a run
+# ('shot', pn)                  - stop, settle, picture pn
+# ('dwell', secs)               - stop and wait
+
+#-----------------------------------------------------------------------------
+# a run of blended moves
+# segs - list of (counts, dirs, speed), labels - (tick, str1, str2) within the run
+# ve - entry and exit velocity of every segment in ticks per second
+
+class Run(object):
+
+    def __init__(self, force):
+        self.force = force
+        self.segs = []
+        self.moves = []
+        self.dirs = {}
+        self.labels = []
+        self.lead = 0
+        self.ve = []
+
+    # eine Achse darf innerhalb eines Laufs nicht die Richtung wechseln
+
+    def fits(self, dirs, force):
+        if force != self.force:
+            return False
+        for mot, d in dirs.items():
+            if self.dirs.get(mot, d) != d:
+                return False
+        return True
+
+    def add(self, moves, counts, dirs, speed):
+        self.segs.append((counts, dirs, speed))
+        self.moves.append(moves)
+        self.dirs.update(dirs)
+        self.lead = self.lead + max(counts.values())
+
+    # steps and directions of the whole run
+
+    def totals(self):
+        counts = {}
+        for c, dirs, speed in self.segs:
+            for mot, n in c.items():
+                counts[mot] = counts.get(mot, 0) + n
+        return counts, dict(self.dirs)
+
+#-----------------------------------------------------------------------------
+# the plan routine
+# returns the blocks to execute: ('run', Run) or the stopping items unchanged
+
+def plan(seq):
+    blocks = []
+    run = None
+    for item in seq:
+        if item[0] == 'move':
+            moves, speed, force = item[1], item[2], item[3]
+            counts = dict((mot, n) for mot, d, n in moves if n > 0)
+            dirs = dict((mot, d) for mot, d, n in moves if n > 0)
+            if not counts:
+                continue
+            if run is None or not run.fits(dirs, force):
+                if run is not None:
+                    blocks.append(('run', run))
+                run = Run(force)
+            run.add(moves, counts, dirs, speed)
+        elif item[0] == 'show' and run is not None:
+            run.labels.append((run.lead, item[1], item[2]))
+        else:
+            if run is not None:
+                blocks.append(('run', run))
+                run = None
+            blocks.append(item)
+    if run is not None:
+        blocks.append(('run', run))
+    for blk in blocks:
+        if blk[0] == 'run':
+            junctions(blk[1])
+    return blocks
+
+#-----------------------------------------------------------------------------
+# junction speeds
+# at a junction every segment runs at the same fraction s of its own vmax,
+# s is limited by the velocity jump of every axis (at most its vstart)
+# and by what the neighbouring segments can accelerate/decelerate (lookahead)
+
+def junctions(run):
+    lim = [fotoprofile.limits_n(counts, speed) for counts, dirs, speed in run.segs]
+    lead = [max(counts.values()) for counts, dirs, speed in run.segs]
+    k = len(run.segs)
+    s = []
+    for j in range(k - 1):
+        c1, c2 = run.segs[j][0], run.segs[j + 1][0]
+        v1, v2 = lim[j][0], lim[j + 1][0]
+        sj = 1.0
+        for mot in set(c1) | set(c2):
+            jump = abs(v1 * c1.get(mot, 0) / lead[j] - v2 * c2.get(mot, 0) / lead[j + 1])
+            if jump > 0:
+                sj = min(sj, fotoprofile.AXES[mot]['vstart'] / jump)
+        s.append(sj)
+
+    # rueckwaerts: jedes Segment muss bis zu seiner Ausfahrt abbremsen koennen
+    vexit = lim[k - 1][2]
+    for i in range(k - 1, 0, -1):
+        vmax, amax, vstart = lim[i]
+        s[i - 1] = min(s[i - 1], math.sqrt(vexit * vexit + 2.0 * amax * lead[i]) / vmax)
+        vexit = s[i - 1] * lim[i - 1][0]
+
+    # vorwaerts: und von seiner Einfahrt aus beschleunigen
+    ventry = lim[0][2]
+    for i in range(k - 1):
+        vmax, amax, vstart = lim[i]
+        s[i] = min(s[i], math.sqrt(ventry * ventry + 2.0 * amax * lead[i]) / vmax)
+        # nie langsamer als Stopp und Neustart
+        s[i] = min(max(s[i], min(vstart / vmax, lim[i + 1][2] / lim[i + 1][0])), 1.0)
+        ventry = s[i] * lim[i + 1][0]
+
+    run.ve = []
+    for i in range(k):
+        ve = lim[i][2] if i == 0 else s[i - 1] * lim[i][0]
+        vx = lim[i][2] if i == k - 1 else s[i] * lim[i][0]
+        run.ve.append((ve, vx))
+
+#-----------------------------------------------------------------------------
+# step masks and periods of a run
+# bits - mask bit per axis
+# returns counts and dirs of the whole run, masks and periods per tick
+
+def compile_run(run, bits, shape="trap"):
+    masks, periods = fotostream.StreamPlan(run, bits, shape).arrays()
+    counts, dirs = run.totals()
+    return counts, dirs, masks, periods
+
+#-----------------------------------------------------------------------------
+# blended against stop-and-go: python fotoplan.py
+
+def duration(seq, settle=2.0):
+    t = 0.0
+    for blk in plan(seq):
+        if blk[0] == 'run':
+            bits = dict((mot, 1 << mot) for mot in blk[1].dirs)
+            t = t + compile_run(blk[1], bits)[3].sum() / 1000000.0
+        elif blk[0] == 'shot':
+            t = t + settle
+        elif blk[0] == 'dwell':
+            t = t + blk[1]
+    return t
+
+if __name__ == "__main__":
+    legs = [[(0, 1, 4100)], [(0, 1, 4100), (1, 1, 400)], [(0, 1, 4100), (1, 1, 800)], [(0, 1, 4100)]]
+    stop = []
+    for moves in legs:
+        stop = stop + [('move', moves, 1, 1), ('dwell', 0.0)]
+    blend = [('move', moves, 1, 1) for moves in legs]
+    print("MX 4x4100 Schritte mit MY-Schwenk: Stop-and-go %.2f s, verschliffen %.2f s" %
+          (duration(stop), duration(blend)))
+
+    # P9: 20 x 160 Schritte MY, je 2 s vor und nach der Aufnahme; jede Fahrt endet an
+    # einer Aufnahme, die mitgelieferten Programme werden also nicht verschliffen
+    p9 = [('shot', 0)]
+    for i in range(1, 21):
+        p9 = p9 + [('dwell', 2.0), ('move', [(1, 0, 160)], 1, 1), ('shot', i)]
+    print("P9 ohne Aufnahmezeit: %.1f s, davon Fahrten %.1f s (keine Verschleifung)" %
+          (duration(p9), duration(p9, 0.0) - 20 * 2.0))
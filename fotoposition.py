@@ -0,0 +1,84 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : position model, fotoposition.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-17
+# Last modified : 2020-01-17
+#
+# Absolute position per axis in steps, updated by every move and written
+# atomically to a file, so it survives a restart of the script. While a
+# move runs the file is marked invalid, a crash mid-move forces homing.
+# A position from the file may be stale (carriage pushed by hand while the
+# power was off), so checked only holds axes referenced in this session.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import os
+import json
+
+#-----------------------------------------------------------------------------
+# the position model
+# path - state file, naxes - number of axes
+# drift - steps travelled since the last reference before homing is due
+
+class Position(object):
+
+    def __init__(self, path, naxes=4, drift=200000):
+        self.path = path
+        self.drift = drift
+        self.pos = [0] * naxes
+        self.known = [False] * naxes
+        self.travel = [0] * naxes
+        self.checked = [False] * naxes
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if not data.get('valid'):
+            return
+        n = len(self.pos)
+        self.pos = (list(data['pos']) + self.pos)[:n]
+        self.known = (list(data['known']) + self.known)[:n]
+        self.travel = (list(data['travel']) + self.travel)[:n]
+
+    # schreiben ueber Temp-Datei und rename, damit nie eine halbe Datei liegt
+
+    def save(self, valid=True):
+        data = {'valid': valid, 'pos': self.pos, 'known': self.known, 'travel': self.travel}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.path)
+
+    # vor und nach jeder Fahrt
+
+    def begin(self):
+        self.save(False)
+
+    def end(self):
+        self.save(True)
+
+    def moved(self, mot, steps):
+        self.pos[mot] = self.pos[mot] + steps
+        self.travel[mot] = self.travel[mot] + abs(steps)
+
+    def reference(self, mot, pos):
+        self.pos[mot] = pos
+        self.known[mot] = True
+        self.checked[mot] = True
+        self.travel[mot] = 0
+
+    def need_home(self, mot):
+        return not self.known[mot] or self.travel[mot] > self.drift
@@ -0,0 +1,183 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : motion profiles, fotoprofile.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-14
+# Last modified : 2020-01-14
+#
+# Precomputes per-step delay tables (accelerate, cruise, decelerate)
+# as NumPy arrays, trapezoidal or S-curve, with limits per axis.
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import math
+import numpy as np
+
+#-----------------------------------------------------------------------------
+# Achsen-Grenzwerte in Schritten pro Sekunde (bei der aktuellen Microstep-Einstellung)
+# vmax - Reisegeschwindigkeit, amax - Beschleunigung (steps/s^2),
+# vstart - Start-/Stoppgeschwindigkeit, bei der der Motor sicher anlaeuft
+
+# Motor MX (mot=0) - 1/8 -Step, 24600 Schritte = 618 mm
+# Motor MY (mot=1) - 1/16-Step, 3200 Schritte = 360 Grad
+# Motor MZ (mot=2) - 1/2 -Step
+# Motor MA (mot=3) - 1/1 -Step
+
+AXES = {
+    0: {'vmax': 4000.0, 'amax': 8000.0, 'vstart': 800.0},
+    1: {'vmax': 3000.0, 'amax': 6000.0, 'vstart': 600.0},
+    2: {'vmax':  800.0, 'amax': 1600.0, 'vstart': 200.0},
+    3: {'vmax':  400.0, 'amax':  800.0, 'vstart': 100.0},
+}
+
+# shortest step period the drivers take (high + low time)
+MINPERIOD = 100
+
+#-----------------------------------------------------------------------------
+# velocity of every step while accelerating from vstart
+# trap  - constant acceleration, v = sqrt(v0^2 + 2*a*s)
+# scurve - sine shaped acceleration (jerk limited), same mean acceleration
+
+def _ramp(numsteps, vmax, amax, vstart, shape):
+    return _ramp_at(np.arange(numsteps, dtype=np.float64), vmax, amax, vstart, shape)
+
+# the same for the step indices s (any range, e.g. one chunk of a long move)
+
+def _ramp_at(s, vmax, amax, vstart, shape):
+    if vmax <= vstart:
+        return np.full(len(s), vmax)
+    if shape == "scurve":
+        tr = (vmax - vstart) / amax
+        dv = vmax - vstart
+        t = np.linspace(0.0, tr, 512)
+        pos = vstart * t + dv / 2.0 * (t - tr / math.pi * np.sin(math.pi * t / tr))
+        ts = np.interp(s, pos, t)
+        v = vstart + dv * (1.0 - np.cos(math.pi * ts / tr)) / 2.0
+        v[s >= pos[-1]] = vmax
+        return v
+    return np.minimum(np.sqrt(vstart * vstart + 2.0 * amax * s), vmax)
+
+#-----------------------------------------------------------------------------
+# the profile routine
+# profile(numsteps, vmax, amax, vstart, shape, vend)
+# vend - velocity at the last step (default vstart), e.g. the junction speed into the next move
+# returns the step periods in microseconds as int64 array (accelerate/cruise/decelerate)
+
+def profile(numsteps, vmax, amax, vstart, shape="trap", vend=None):
+    return profile_at(0, numsteps, numsteps, vmax, amax, vstart, shape, vend)
+
+# periods of the steps k0 .. k1-1 only, memory grows with the chunk, not with numsteps
+
+def profile_at(k0, k1, numsteps, vmax, amax, vstart, shape="trap", vend=None):
+    if k1 <= k0:
+        return np.zeros(0, dtype=np.int64)
+    if vend is None:
+        vend = vstart
+    vstart = min(vstart, vmax)
+    vend = min(vend, vmax)
+    s = np.arange(k0, k1, dtype=np.float64)
+    va = _ramp_at(s, vmax, amax, vstart, shape)
+    vd = _ramp_at(numsteps - 1 - s, vmax, amax, vend, shape)
+    v = np.minimum(va, vd)
+    per = np.rint(1000000.0 / v).astype(np.int64)
+    return np.maximum(per, MINPERIOD)
+
+#-----------------------------------------------------------------------------
+# video moves: ramp up, cruise at one constant speed, ramp down, in secs seconds
+# the cruise speed v solves T = v/a - 2*vs/a + (n + vs^2/a)/v (continuous trapezoid),
+# the cruise period is then fitted to the discrete ramps
+# returns up, down (float periods of the ramps), pc (cruise period), v
+
+def video_ramps(numsteps, secs, vmax, amax, vstart, shape="trap"):
+    vstart = min(vstart, vmax)
+    t = secs * amax + 2.0 * vstart
+    disc = t * t - 4.0 * (amax * numsteps + vstart * vstart)
+    vreach = math.sqrt(amax * numsteps + vstart * vstart)
+    if numsteps / float(secs) <= vstart:
+        v = numsteps / float(secs)
+    elif disc < 0:
+        v = min(vmax, vreach)
+    else:
+        v = min(vmax, (t - math.sqrt(disc)) / 2.0)
+    nu = 0
+    if v > vstart:
+        nu = min(int(math.ceil((v * v - vstart * vstart) / (2.0 * amax))), numsteps // 2)
+    up = 1000000.0 / np.minimum(_ramp(nu, vmax, amax, vstart, shape), v)
+    down = up[::-1]
+    nc = numsteps - 2 * nu
+    pc = 1000000.0 / v
+    if nc > 0:
+        pc = max((secs * 1000000.0 - 2.0 * up.sum()) / nc, 1000000.0 / vmax)
+    return up, down, pc, v
+
+# periods of the steps k0 .. k1-1 from absolute deadlines (rounded once, no drift)
+# ramps - as returned by video_ramps()
+
+def video_at(k0, k1, numsteps, ramps):
+    if k1 <= k0:
+        return np.zeros(0, dtype=np.int64)
+    up, down, pc, v = ramps
+    nu = len(up)
+    nc = numsteps - nu - len(down)
+    k = np.arange(k0, k1 + 1, dtype=np.int64)
+    cu = np.concatenate([[0.0], np.cumsum(up)])
+    cd = np.concatenate([[0.0], np.cumsum(down)])
+    t = cu[np.minimum(k, nu)] + np.clip(k - nu, 0, nc) * pc + cd[np.clip(k - nu - nc, 0, len(down))]
+    per = np.diff(np.rint(t).astype(np.int64))
+    return np.maximum(per, MINPERIOD)
+
+#-----------------------------------------------------------------------------
+# braking ramp from velocity v down to vstart (emergency stop)
+# returns the step periods in microseconds, empty if v is already at vstart
+
+def stop_profile(v, amax, vstart, shape="trap"):
+    if v <= vstart:
+        return np.zeros(0, dtype=np.int64)
+    n = int(math.ceil((v * v - vstart * vstart) / (2.0 * amax)))
+    va = _ramp(n, v, amax, vstart, shape)[::-1]
+    per = np.rint(1000000.0 / va).astype(np.int64)
+    return np.maximum(per, MINPERIOD)
+
+#-----------------------------------------------------------------------------
+# profile for an axis
+# speed - 1-voll 2-halb 3-drittel etc., divides vmax like in stepper()
+
+def axis_profile(mot, numsteps, speed=1, shape="trap"):
+    ax = AXES[mot]
+    vmax = ax['vmax'] / speed
+    return profile(numsteps, vmax, ax['amax'], ax['vstart'], shape)
+
+# limits of a coordinated move along the lead axis (most steps)
+# counts - steps per axis, the limits of every axis are scaled to the lead axis
+# returns vmax, amax, vstart in ticks per second
+
+def limits_n(counts, speed=1):
+    lead = max(counts.values())
+    vmax = amax = vstart = float('inf')
+    for mot, n in counts.items():
+        if n <= 0:
+            continue
+        ax = AXES[mot]
+        r = lead / n
+        vmax = min(vmax, ax['vmax'] * r)
+        amax = min(amax, ax['amax'] * r)
+        vstart = min(vstart, ax['vstart'] * r)
+    return vmax / speed, amax, vstart
+
+def axis_profile_n(counts, speed=1, shape="trap"):
+    vmax, amax, vstart = limits_n(counts, speed)
+    return profile(max(counts.values()), vmax, amax, vstart, shape)
+
+#-----------------------------------------------------------------------------
+# Vergleich alte Festgeschwindigkeit / Profil: python fotoprofile.py
+
+if __name__ == "__main__":
+    for shape in ("trap", "scurve"):
+        per = axis_profile(0, 24600, 1, shape)
+        print("MX 24600 Schritte %-6s: %.2f s (alt: %.2f s)" % (shape, per.sum() / 1000000.0, 24600 * 0.0006))
@@ -0,0 +1,415 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : pulse backends, fotopulse.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-12
+# Last modified : 2020-01-12
+#
+# A move is compiled into a waveform (pin, edge, microsecond offset) and
+# handed to a backend in one go. The pigpio backend plays it DMA-timed,
+# the gpio backend falls back to RPi.GPIO, the sim backend only records.
+# send() returns while the last waveform may still play, so the next one
+# follows without a gap; flush() waits until everything is out.
+# With a fototiming.StepLog in backend.log every rising step edge is stamped.
+# Edges at the same offset are written as one bank write (set/clear masks),
+# bank() does the same for the direction pins.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import os
+import time
+
+#-----------------------------------------------------------------------------
+# edges
+
+RISE = 1
+FALL = 0
+
+# pigpio can only hold a limited number of pulses per wave
+MAXPULSES = 2000
+
+# a send() later than this after the end of the last waveform starts a new schedule
+SLACK = 0.002
+
+# overhead compensation of the deadline loop: gain per step and upper bound (seconds)
+COMPGAIN = 0.05
+COMPMAX = 0.0005
+
+#-----------------------------------------------------------------------------
+# the waveform
+# events - list of (pin, edge, offset_us), sorted by offset
+# length_us - total length incl. the trailing low time of the last step
+
+class Waveform(object):
+
+    def __init__(self):
+        self.events = []
+        self.length_us = 0
+        self.steps = 0
+
+    def add(self, pin, edge, offset_us):
+        self.events.append((pin, edge, offset_us))
+
+    def groups(self):
+        # gruppiert die Events nach Offset zu (offset_us, on_mask, off_mask)
+        res = []
+        i = 0
+        n = len(self.events)
+        while i < n:
+            off = self.events[i][2]
+            on_mask = 0
+            off_mask = 0
+            while i < n and self.events[i][2] == off:
+                pin, edge, o = self.events[i]
+                if edge == RISE:
+                    on_mask |= 1 << pin
+                else:
+                    off_mask |= 1 << pin
+                i = i + 1
+            res.append((off, on_mask, off_mask))
+        return res
+
+    def pulses(self):
+        # (on_mask, off_mask, delay_us) wie pigpio.pulse
+        res = []
+        groups = self.groups()
+        for i in range(len(groups)):
+            off, on_mask, off_mask = groups[i]
+            if i + 1 < len(groups):
+                nxt = groups[i + 1][0]
+            else:
+                nxt = self.length_us
+            res.append((on_mask, off_mask, nxt - off))
+        return res
+
+#-----------------------------------------------------------------------------
+# pins of a mask
+
+def mask_pins(mask):
+    pins = []
+    pin = 0
+    while mask:
+        if mask & 1:
+            pins.append(pin)
+        mask = mask >> 1
+        pin = pin + 1
+    return pins
+
+#-----------------------------------------------------------------------------
+# compile a step train
+# ticks - iterable, per step a list of step pins toggled together
+# high_us / low_us - pulse high and low time in microseconds
+
+def compile_train(ticks, high_us, low_us):
+    wave = Waveform()
+    t = 0
+    for pins in ticks:
+        for pin in pins:
+            wave.add(pin, RISE, t)
+        for pin in pins:
+            wave.add(pin, FALL, t + high_us)
+        t = t + high_us + low_us
+        wave.steps = wave.steps + 1
+    wave.length_us = t
+    return wave
+
+def compile_steps(pin, numsteps, high_us, low_us):
+    return compile_train([[pin]] * numsteps, high_us, low_us)
+
+# compile a step train with a period per step (see fotoprofile.py)
+# periods - step periods in microseconds, high_us - pulse width
+
+def compile_timed(ticks, periods, high_us):
+    wave = Waveform()
+    t = 0
+    for pins, per in zip(ticks, periods):
+        per = int(per)
+        high = min(high_us, per // 2)
+        for pin in pins:
+            wave.add(pin, RISE, t)
+        for pin in pins:
+            wave.add(pin, FALL, t + high)
+        t = t + per
+        wave.steps = wave.steps + 1
+    wave.length_us = t
+    return wave
+
+#-----------------------------------------------------------------------------
+# recording simulator backend
+# keeps every waveform and the pin levels, time runs only virtually
+
+class SimBackend(object):
+
+    name = "sim"
+
+    def __init__(self):
+        self.levels = {}
+        self.waves = []
+        self.time_us = 0
+        self.log = None
+        self.writes = 0
+
+    def setup(self, pins):
+        for pin in pins:
+            self.levels[pin] = False
+
+    def write(self, pin, level):
+        self.levels[pin] = bool(level)
+        self.writes = self.writes + 1
+
+    def bank(self, set_mask, clear_mask):
+        for pin in mask_pins(set_mask):
+            self.levels[pin] = True
+        for pin in mask_pins(clear_mask):
+            self.levels[pin] = False
+        self.writes = self.writes + 1
+
+    def send(self, wave):
+        log = self.log
+        for off, on_mask, off_mask in wave.groups():
+            self.bank(on_mask, off_mask)
+            if log is not None and on_mask:
+                log.stamp(self.time_us + off)
+        self.waves.append(wave)
+        self.time_us = self.time_us + wave.length_us
+
+    def flush(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+    # Auswertung fuer Tests/Benchmarks
+
+    def steps(self, pin):
+        n = 0
+        for wave in self.waves:
+            for p, edge, off in wave.events:
+                if p == pin and edge == RISE:
+                    n = n + 1
+        return n
+
+    def reset(self):
+        self.waves = []
+        self.time_us = 0
+        self.writes = 0
+
+#-----------------------------------------------------------------------------
+# RPi.GPIO backend
+# plays the waveform against absolute deadlines, no DMA timing available
+
+class GpioBackend(object):
+
+    name = "gpio"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.t_end = None
+        self.log = None
+        self.lists = {}
+        self.comp = 0.0
+        GPIO.setmode(GPIO.BCM)
+
+    def setup(self, pins):
+        for pin in pins:
+            self.GPIO.setup(pin, self.GPIO.OUT)
+            self.GPIO.output(pin, False)
+
+    def write(self, pin, level):
+        self.GPIO.output(pin, level)
+
+    # RPi.GPIO nimmt eine Kanalliste je Pegel, die Listen werden je Maske gemerkt
+
+    def pins(self, mask):
+        if mask not in self.lists:
+            self.lists[mask] = mask_pins(mask)
+        return self.lists[mask]
+
+    def bank(self, set_mask, clear_mask):
+        if set_mask:
+            self.GPIO.output(self.pins(set_mask), True)
+        if clear_mask:
+            self.GPIO.output(self.pins(clear_mask), False)
+
+    # every edge has an absolute deadline; comp - measured sleep overshoot plus write time,
+    # the edge is started that much earlier so that the pins change on the deadline
+
+    def send(self, wave):
+        bank = self.bank
+        comp = self.comp
+        t0 = time.time()
+        # direkt anschliessend an die letzte Welle weiterplanen
+        if self.t_end is not None and t0 - self.t_end < SLACK:
+            t0 = self.t_end
+        for off, on_mask, off_mask in wave.groups():
+            due = t0 + off / 1000000.0
+            delay = due - comp - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            bank(on_mask, off_mask)
+            if on_mask:
+                now = time.time()
+                # nur nach einem Warten nachfuehren, beim Aufholen ist die Verspaetung kein Overhead
+                if delay > 0:
+                    comp = min(max(comp + COMPGAIN * (now - due), 0.0), COMPMAX)
+                if self.log is not None:
+                    self.log.stamp(int(now * 1000000))
+        self.comp = comp
+        self.t_end = t0 + wave.length_us / 1000000.0
+
+    def flush(self):
+        if self.t_end is not None:
+            delay = self.t_end - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self.t_end = None
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+#-----------------------------------------------------------------------------
+# pigpio backend
+# the waveform goes to the pigpio daemon (sudo pigpiod), DMA-timed pulses
+# edge timestamps only with a StepLog attached as log before setup()
+
+class PigpioBackend(object):
+
+    name = "pigpio"
+
+    def __init__(self):
+        import pigpio
+        self.pigpio = pigpio
+        self.pi = pigpio.pi()
+        self.wids = []
+        self.log = None
+        self.cbs = []
+        self.tick = None
+        self.wrap = 0
+        if not self.pi.connected:
+            raise IOError("pigpiod nicht erreichbar")
+
+    def setup(self, pins):
+        for pin in pins:
+            self.pi.set_mode(pin, self.pigpio.OUTPUT)
+            self.pi.write(pin, 0)
+            # die Flanken meldet der Daemon mit seinem Mikrosekunden-Tick, nur mit StepLog
+            if self.log is not None:
+                self.cbs.append(self.pi.callback(pin, self.pigpio.RISING_EDGE, self.edge))
+
+    def edge(self, gpio, level, tick):
+        if self.log is None:
+            return
+        if self.tick is not None and tick < self.tick:
+            self.wrap = self.wrap + (1 << 32)
+        self.tick = tick
+        self.log.stamp(self.wrap + tick)
+
+    def write(self, pin, level):
+        self.pi.write(pin, 1 if level else 0)
+
+    def bank(self, set_mask, clear_mask):
+        if set_mask:
+            self.pi.set_bank_1(set_mask)
+        if clear_mask:
+            self.pi.clear_bank_1(clear_mask)
+
+    def send(self, wave):
+        pi = self.pi
+        wids = self.wids
+        pulses = wave.pulses()
+        for i in range(0, len(pulses), MAXPULSES):
+            chunk = [self.pigpio.pulse(on, off, d) for on, off, d in pulses[i:i + MAXPULSES]]
+            pi.wave_add_generic(chunk)
+            wid = pi.wave_create()
+            # SYNC haengt die Welle nahtlos an die laufende an
+            pi.wave_send_using_mode(wid, self.pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            wids.append(wid)
+            # abgespielte Wellen freigeben, hoechstens eine wartet hinter der laufenden
+            while len(wids) > 2:
+                if pi.wave_tx_at() == wids[0]:
+                    time.sleep(0.0005)
+                    continue
+                pi.wave_delete(wids.pop(0))
+
+    def flush(self):
+        pi = self.pi
+        while pi.wave_tx_busy():
+            time.sleep(0.001)
+        if self.log is not None:
+            # letzte Flanken-Meldungen abwarten
+            time.sleep(0.01)
+        for wid in self.wids:
+            pi.wave_delete(wid)
+        self.wids = []
+
+    def cleanup(self):
+        for cb in self.cbs:
+            cb.cancel()
+        self.pi.wave_clear()
+        self.pi.stop()
+
+#-----------------------------------------------------------------------------
+# backend selection
+# FOTO_PULSE=pigpio|gpio|mem|rt|sim, default: pigpio if the daemon runs, else gpio
+# mem - gpio registers via /dev/gpiomem, see fotogpiomem.py
+# rt - RPi.GPIO in a pinned real-time process, see fotort.py
+
+def backend(name=None):
+    if name is None:
+        name = os.environ.get('FOTO_PULSE', '')
+    if name == "sim":
+        return SimBackend()
+    if name == "gpio":
+        return GpioBackend()
+    if name == "pigpio":
+        return PigpioBackend()
+    if name == "mem":
+        import fotogpiomem
+        return fotogpiomem.MemBackend()
+    if name == "rt":
+        import fotort
+        return fotort.RtBackend()
+    try:
+        return PigpioBackend()
+    except (ImportError, IOError):
+        return GpioBackend()
+
+#-----------------------------------------------------------------------------
+# benchmark on a plain Linux box: python fotopulse.py
+
+def bench():
+    sim = SimBackend()
+    # Nullung wie in foto.py: 27000 Schritte, speed 1, Endstop beachtet
+    t = time.time()
+    wave = compile_steps(5, 27000, 500, 100)
+    tc = time.time() - t
+    t = time.time()
+    pulses = wave.pulses()
+    tp = time.time() - t
+    sim.send(wave)
+    print("Nullung 27000 Schritte")
+    print("  Events      : %d" % len(wave.events))
+    print("  Pulse       : %d" % len(pulses))
+    print("  Kompiliert  : %.1f ms" % (tc * 1000))
+    print("  Pulse-Liste : %.1f ms" % (tp * 1000))
+    print("  Fahrzeit    : %.2f s (Soll)" % (sim.time_us / 1000000.0))
+    print("  Schritte    : %d" % sim.steps(5))
+
+    # P5: MX und MY gemeinsam, Schreibzugriffe je Pin gegen je Flanke
+    sim = SimBackend()
+    ticks = [[5, 6] if i % 31 == 0 else [5] for i in range(24600)]
+    wave = compile_train(ticks, 50, 200)
+    sim.send(wave)
+    print("P5 24600:800 Schritte")
+    print("  Einzelpin   : %d Schreibzugriffe" % len(wave.events))
+    print("  Bank        : %d Schreibzugriffe" % sim.writes)
+
+if __name__ == "__main__":
+    bench()
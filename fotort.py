@@ -0,0 +1,236 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : real-time step runner, fotort.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-24
+# Last modified : 2020-01-24
+#
+# Opt-in pulse backend (FOTO_PULSE=rt) for the RPi.GPIO path: waveforms
+# are played by a separate process pinned to one core (best isolated with
+# isolcpus=3 in /boot/cmdline.txt) with SCHED_FIFO where permitted. Every
+# edge waits with a hybrid sleep-then-spin loop against perf_counter.
+#
+#   python fotort.py       measures the jitter under load, old loop vs rt
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import os
+import time
+import multiprocessing
+
+import fotopulse
+
+# core, SCHED_FIFO priority and spin window in seconds
+RT_CORE = 3
+RT_PRIO = 50
+RT_SPIN = 0.0002
+
+clock = getattr(time, 'perf_counter', time.time)
+
+#-----------------------------------------------------------------------------
+# hybrid wait: sleep until shortly before the deadline, spin the rest
+
+def wait_until(deadline, spin=RT_SPIN):
+    rest = deadline - clock()
+    if rest > spin:
+        time.sleep(rest - spin)
+    while clock() < deadline:
+        pass
+
+#-----------------------------------------------------------------------------
+# core pinning and SCHED_FIFO for the calling process, returns what worked
+
+def rt_setup(core=RT_CORE, prio=RT_PRIO):
+    res = []
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            if core < multiprocessing.cpu_count():
+                os.sched_setaffinity(0, [core])
+                res.append("Kern %d" % core)
+        except OSError:
+            pass
+    if hasattr(os, 'sched_setscheduler'):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(prio))
+            res.append("SCHED_FIFO %d" % prio)
+        except (OSError, AttributeError):
+            pass
+    return res
+
+#-----------------------------------------------------------------------------
+# the runner process
+# commands: ('setup', pins), ('bank', set, clear), ('wave', groups, length_us), ('stop',)
+# answers every wave with ('done', rising edge timestamps in us)
+
+class NoGpio(object):
+
+    BCM = 11
+    OUT = 0
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def output(self, pins, level):
+        pass
+
+def runner(cmd, ack, core, prio, spin, fake):
+    ack.put(('rt', rt_setup(core, prio)))
+    if fake:
+        GPIO = NoGpio()
+    else:
+        import RPi.GPIO as GPIO
+        GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    lists = {}
+
+    def bank(set_mask, clear_mask):
+        if set_mask:
+            if set_mask not in lists:
+                lists[set_mask] = fotopulse.mask_pins(set_mask)
+            GPIO.output(lists[set_mask], True)
+        if clear_mask:
+            if clear_mask not in lists:
+                lists[clear_mask] = fotopulse.mask_pins(clear_mask)
+            GPIO.output(lists[clear_mask], False)
+
+    t_end = None
+    while True:
+        c = cmd.get()
+        if c[0] == 'stop':
+            break
+        if c[0] == 'setup':
+            for pin in c[1]:
+                GPIO.setup(pin, GPIO.OUT)
+        elif c[0] == 'bank':
+            bank(c[1], c[2])
+        elif c[0] == 'wave':
+            groups, length_us = c[1], c[2]
+            t0 = clock()
+            if t_end is not None and t0 - t_end < fotopulse.SLACK:
+                t0 = t_end
+            stamps = []
+            for off, on_mask, off_mask in groups:
+                wait_until(t0 + off / 1000000.0, spin)
+                bank(on_mask, off_mask)
+                if on_mask:
+                    stamps.append(int(clock() * 1000000))
+            t_end = t0 + length_us / 1000000.0
+            ack.put(('done', stamps))
+        elif c[0] == 'flush':
+            if t_end is not None:
+                wait_until(t_end, spin)
+            t_end = None
+            ack.put(('flushed', None))
+
+#-----------------------------------------------------------------------------
+# the backend, same interface as in fotopulse.py
+
+class RtBackend(object):
+
+    name = "rt"
+
+    def __init__(self, core=RT_CORE, prio=RT_PRIO, spin=RT_SPIN, fake=False):
+        self.cmd = multiprocessing.Queue()
+        self.ack = multiprocessing.Queue()
+        self.log = None
+        self.pending = 0
+        self.proc = multiprocessing.Process(target=runner, args=(self.cmd, self.ack, core, prio, spin, fake))
+        self.proc.daemon = True
+        self.proc.start()
+        self.rt = self.ack.get()[1]
+
+    def setup(self, pins):
+        self.cmd.put(('setup', list(pins)))
+
+    def write(self, pin, level):
+        if level:
+            self.bank(1 << pin, 0)
+        else:
+            self.bank(0, 1 << pin)
+
+    def bank(self, set_mask, clear_mask):
+        self.cmd.put(('bank', set_mask, clear_mask))
+
+    def done(self):
+        kind, stamps = self.ack.get()
+        self.pending = self.pending - 1
+        if self.log is not None:
+            for t in stamps:
+                self.log.stamp(t)
+
+    # hoechstens eine Welle wartet hinter der laufenden
+
+    def send(self, wave):
+        self.cmd.put(('wave', wave.groups(), wave.length_us))
+        self.pending = self.pending + 1
+        while self.pending > 1:
+            self.done()
+
+    def flush(self):
+        while self.pending > 0:
+            self.done()
+        self.cmd.put(('flush',))
+        self.ack.get()
+
+    def cleanup(self):
+        self.cmd.put(('stop',))
+        self.proc.join(1.0)
+
+#-----------------------------------------------------------------------------
+# jitter under load: python fotort.py
+# load - busy processes on all cores, like GUI + gphoto2 download at once
+
+def burn():
+    x = 0
+    while True:
+        x = x + 1
+
+def old_loop(steps, period, log):
+    # wie der alte stepper(): relative Sleeps je Flanke
+    for i in range(steps):
+        log.stamp(int(clock() * 1000000))
+        time.sleep(period / 2.0)
+        time.sleep(period / 2.0)
+
+def measure(name, run, steps, period_us):
+    import fototiming
+    log = fototiming.StepLog(steps)
+    log.begin()
+    run(log)
+    st = log.end([period_us] * steps)
+    print("  %-22s: p50 %6.0f us, p99 %6.0f us, max. Luecke %6.2f ms, %4.0f Schritte/s (Soll %.0f)" %
+          (name, st['p50_us'], st['p99_us'], st['maxgap_us'] / 1000.0, st['steps_s'], 1000000.0 / period_us))
+
+def bench(steps=2000, period_us=500):
+    wave = fotopulse.compile_steps(5, steps, 50, period_us - 50)
+    load = [multiprocessing.Process(target=burn) for i in range(multiprocessing.cpu_count())]
+    for p in load:
+        p.daemon = True
+        p.start()
+    print("%d Schritte zu %d us unter Last (%d Prozesse)" % (steps, period_us, len(load)))
+    try:
+        measure("alte Schleife", lambda log: old_loop(steps, period_us / 1000000.0, log), steps, period_us)
+        rt = RtBackend(fake=True)
+        print("  rt-Prozess: " + (", ".join(rt.rt) or "ohne Kern/Prioritaet (keine Rechte)"))
+
+        def run_rt(log):
+            rt.log = log
+            rt.send(wave)
+            rt.flush()
+        measure("rt sleep+spin", run_rt, steps, period_us)
+        rt.cleanup()
+    finally:
+        for p in load:
+            p.terminate()
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : settle model, fotosettle.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-02-03
+# Last modified : 2020-02-03
+#
+# Dwell before a shot from the move just made instead of a fixed 2 s.
+# The residual swing of rail and camera starts with the braking of the
+# last segment and dies out with the axis' time constant:
+#
+#   t = base + tau * ln(1 + gain * x),  x = a/amax * v/vmax * n/stroke
+#
+# a - deceleration used, v - peak speed reached, n - steps of the axis.
+# Most moves reach vmax, so the travel as a share of the axis stroke
+# tells a short hop from a full rail slide (belt and rail wind up over
+# the run). The constants per axis can be measured with the sharpness of
+# preview frames after test moves and are kept in a JSON file. The
+# defaults and the calibration (SETTLE_TESTS in foto.py) cover MX 400 to
+# 24600 steps and MY 160 to 3200 steps at speed 1; outside of that the
+# dwell is a guess, at most LIMIT.
+#
+#   python fotosettle.py         settle times of some moves
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import io
+import os
+import re
+import json
+import math
+import numpy as np
+
+import fotoprofile
+
+#-----------------------------------------------------------------------------
+# Konstanten je Achse (mot 0..3), ein voller Schienenlauf MX ergibt die alten 2 s
+# base - Mindestzeit, tau - Abklingzeit in s, gain - Anregung bei voller Bremsung aus vmax
+# nach dem ganzen Hub, stroke - Hub in Schritten (Schiene MX, eine Umdrehung MY/MZ/MA)
+
+AXES = {
+    0: {'base': 0.3, 'tau': 0.8, 'gain': 7.4, 'stroke': 24600},
+    1: {'base': 0.2, 'tau': 0.4, 'gain': 30.0, 'stroke': 3200},
+    2: {'base': 0.2, 'tau': 0.4, 'gain': 4.0, 'stroke': 3200},
+    3: {'base': 0.2, 'tau': 0.4, 'gain': 4.0, 'stroke': 3200},
+}
+
+# hoechstens so lange warten, ein Bild gilt ab SHARP der Endschaerfe als ruhig
+LIMIT = 4.0
+SHARP = 0.9
+
+#-----------------------------------------------------------------------------
+# excitation per axis of a segment (counts per axis, speed divisor as in limits_n),
+# a trapezoid brakes with amax from the highest speed it reaches
+
+def excitation(counts, speed=1, axes=AXES):
+    counts = dict((mot, n) for mot, n in counts.items() if n > 0)
+    if not counts:
+        return {}
+    lead = max(counts.values())
+    vmax, amax, vstart = fotoprofile.limits_n(counts, speed)
+    peak = min(vmax, math.sqrt(vstart * vstart + amax * lead))
+    x = {}
+    for mot, n in counts.items():
+        ax = fotoprofile.AXES[mot]
+        r = n / lead
+        travel = min(1.0, n / axes[mot]['stroke'])
+        x[mot] = (amax * r / ax['amax']) * (peak * r / ax['vmax']) * travel
+    return x
+
+#-----------------------------------------------------------------------------
+# the settle model
+# path - JSON file with calibrated constants (None = defaults only)
+
+class Settle(object):
+
+    def __init__(self, path=None):
+        self.path = path
+        self.axes = dict((mot, dict(c)) for mot, c in AXES.items())
+        self.load()
+
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        for mot, c in data.items():
+            self.axes[int(mot)].update(c)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict((str(mot), c) for mot, c in self.axes.items()), f)
+        os.rename(tmp, self.path)
+
+    def axis(self, mot, x):
+        c = self.axes[mot]
+        return min(LIMIT, c['base'] + c['tau'] * math.log(1.0 + c['gain'] * x))
+
+    # dwell after a segment that stopped the axes, 0 when nothing moved
+
+    def after(self, counts, speed=1):
+        x = excitation(counts, speed, self.axes)
+        if not x:
+            return 0.0
+        return max(self.axis(mot, v) for mot, v in x.items())
+
+    # new base and tau of an axis from measured (x, seconds), gain stays
+
+    def fit(self, mot, samples):
+        c = self.axes[mot]
+        xs = np.array([math.log(1.0 + c['gain'] * x) for x, t in samples])
+        ts = np.array([t for x, t in samples])
+        if len(set(np.round(xs, 6))) > 1:
+            tau, base = np.polyfit(xs, ts, 1)
+            c['base'] = round(float(max(base, 0.0)), 3)
+        else:
+            tau = (ts.mean() - c['base']) / max(xs.mean(), 1e-6)
+        c['tau'] = round(float(max(tau, 0.05)), 3)
+        return c
+
+#-----------------------------------------------------------------------------
+# calibration from preview frames
+
+# sharpness of a preview: variance of the Laplacian of the grey image,
+# PGM as from the simulator or JPEG (needs PIL)
+
+def sharpness(data):
+    m = re.match(br"P5\s+(\d+)\s+(\d+)\s+(\d+)\s", data)
+    if m:
+        w, h = int(m.group(1)), int(m.group(2))
+        a = np.frombuffer(data[m.end():m.end() + w * h], dtype=np.uint8).reshape(h, w)
+    else:
+        from PIL import Image
+        a = np.asarray(Image.open(io.BytesIO(data)).convert('L'))
+    a = a.astype(np.float64)
+    lap = 4.0 * a[1:-1, 1:-1] - a[:-2, 1:-1] - a[2:, 1:-1] - a[1:-1, :-2] - a[1:-1, 2:]
+    return float(lap.var())
+
+# seconds after t_stop until the previews stay sharp
+# preview() - one frame (bytes), frames every `every` seconds, the last 3 give the reference
+
+def measure(preview, clock, sleep, t_stop, frames=30, every=0.1):
+    ts = []
+    ss = []
+    for i in range(frames):
+        ss.append(sharpness(preview()))
+        ts.append(clock() - t_stop)
+        sleep(every)
+    ref = sum(ss[-3:]) / 3.0
+    k = len(ss)
+    while k > 0 and ss[k - 1] >= SHARP * ref:
+        k = k - 1
+    return ts[min(k, len(ts) - 1)]
+
+def summary(st):
+    return ", ".join("M%s base %.2f s tau %.2f s" % ("XYZA"[mot], c['base'], c['tau'])
+                     for mot, c in sorted(st.axes.items()))
+
+#-----------------------------------------------------------------------------
+# settle times of some moves: python fotosettle.py
+
+if __name__ == "__main__":
+    st = Settle()
+    for name, counts in [("MX 24600 (ganze Schiene)", {0: 24600}), ("MX 12300", {0: 12300}),
+                         ("MX 2000", {0: 2000}), ("MY 3200 (360 Grad)", {1: 3200}),
+                         ("MY 160 (18 Grad)", {1: 160}), ("MX 24600 + MY 800", {0: 24600, 1: 800})]:
+        print("%-26s: %.2f s" % (name, st.after(counts)))
+    print("P9 (20 x MY 160): %.1f s statt %.1f s" % (20 * st.after({1: 160}), 20 * 2.0))
@@ -0,0 +1,490 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : simulated hardware, fotosim.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-22
+# Last modified : 2020-01-22
+#
+# Stands in for RPi.GPIO, smbus, gphoto2 and subprocess on any Linux box.
+# Everything runs on a virtual clock: sleeps and step pulses only advance
+# the clock, so a whole program takes milliseconds. The rig counts steps
+# per axis, models the MX endstop on the PCF8574 and writes shot files.
+#
+#   FOTO_SIM=1 python foto.py          (or FOTO_SIM=<directory>)
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import os
+import math
+import time as _time
+import threading
+
+import numpy as np
+
+import fotopulse
+import fotoprofile
+
+#-----------------------------------------------------------------------------
+# virtual clock, same names as the time module
+# hooks - called as the clock runs on (e.g. the camera event poll), sleeps in SLICE steps then
+
+class Clock(object):
+
+    SLICE = 0.05
+
+    def __init__(self):
+        self.t = 0.0
+        self.slept = 0.0
+        self.hooks = []
+        self.hooking = False
+
+    def time(self):
+        return self.t
+
+    monotonic = time
+    perf_counter = time
+
+    def sleep(self, secs):
+        while secs > 0:
+            d = secs
+            if self.hooks and not self.hooking:
+                d = min(secs, self.SLICE)
+            self.t = self.t + d
+            self.slept = self.slept + d
+            secs = secs - d
+            self.run_hooks()
+
+    def advance(self, secs):
+        self.t = self.t + secs
+        self.run_hooks()
+
+    def run_hooks(self):
+        if self.hooking:
+            return
+        self.hooking = True
+        try:
+            for hook in self.hooks:
+                hook()
+        finally:
+            self.hooking = False
+
+#-----------------------------------------------------------------------------
+# RPi.GPIO
+
+class Gpio(object):
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    PUD_UP = 22
+    FALLING = 32
+
+    def __init__(self):
+        self.levels = {}
+        self.writes = 0
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None):
+        self.levels.setdefault(pin, False)
+
+    def output(self, pin, level):
+        self.levels[pin] = bool(level)
+        self.writes = self.writes + 1
+
+    def input(self, pin):
+        return 1 if self.levels.get(pin, True) else 0
+
+    def add_event_detect(self, pin, edge, callback=None):
+        pass
+
+    def cleanup(self):
+        pass
+
+#-----------------------------------------------------------------------------
+# PCF8574 with the MX endstop on P2 (mask 0x04)
+# closed while the carriage is at or right of the endstop (xpos <= 0)
+
+class Expander(object):
+
+    def __init__(self, rig):
+        self.rig = rig
+        self.reads = 0
+        self.writes = 0
+
+    def SMBus(self, bus):
+        return self
+
+    def read_byte(self, addr):
+        self.reads = self.reads + 1
+        if self.rig.xpos <= 0:
+            return 0x04
+        return 0x00
+
+    def write_byte(self, addr, val):
+        self.writes = self.writes + 1
+
+#-----------------------------------------------------------------------------
+# gphoto2 camera with fixed durations for init, capture and download
+# a download in the background thread (fotocam.Downloader) does not sleep, it keeps
+# the camera busy until rig.cam_busy, the next camera call waits for that time
+
+class CameraFilePath(object):
+
+    def __init__(self, folder, name):
+        self.folder = folder
+        self.name = name
+
+class CameraFile(object):
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def get_data_and_size(self):
+        return self.data
+
+    def save(self, target):
+        with open(target, "wb") as f:
+            f.write(self.data)
+
+# config tree of the camera, only capturetarget
+
+class CameraWidget(object):
+
+    def __init__(self, name, value=None, choices=()):
+        self.name = name
+        self.value = value
+        self.choices = list(choices)
+        self.children = {}
+
+    def get_child_by_name(self, name):
+        return self.children[name]
+
+    def count_choices(self):
+        return len(self.choices)
+
+    def get_choice(self, i):
+        return self.choices[i]
+
+    def get_value(self):
+        return self.value
+
+    def set_value(self, value):
+        self.value = value
+
+class Camera(object):
+
+    T_INIT = 1.0
+    T_CAPTURE = 0.8
+    T_DOWNLOAD = 1.5
+    T_EXIT = 0.2
+
+    def __init__(self, rig):
+        self.rig = rig
+
+    def idle(self):
+        rig = self.rig
+        rig.clock.sleep(rig.cam_busy - rig.clock.t)
+
+    def init(self):
+        self.idle()
+        self.rig.clock.sleep(self.T_INIT)
+
+    T_SUMMARY = 0.05
+
+    def capture(self, kind):
+        rig = self.rig
+        self.idle()
+        rig.captures = rig.captures + 1
+        if rig.captures == rig.ptp_at:
+            # USB/PTP-Fehler einmalig bei dieser Ausloesung
+            rig.clock.sleep(self.T_CAPTURE)
+            raise GPhoto2Error(Gphoto.GP_ERROR_IO)
+        rig.clock.sleep(self.T_CAPTURE)
+        rig.shots = rig.shots + 1
+        name = "DSC_%04d.JPG" % rig.shots
+        rig.card[name] = (rig.clock.time(), list(rig.pos))
+        return CameraFilePath("/store_00010001/DCIM/100NIKON", name)
+
+    # event mode: the release returns at once, the exposure takes T_EXPOSE (CAPTURE_COMPLETE),
+    # the file is ready T_CAPTURE after the previous one (camera speed), at most BUFFER
+    # frames wait in the camera
+
+    T_TRIGGER = 0.05
+    T_EXPOSE = 0.5
+    BUFFER = 4
+
+    def trigger_capture(self):
+        rig = self.rig
+        now = rig.clock.t
+        if len([r for r, kind, name in rig.events if kind == Gphoto.GP_EVENT_FILE_ADDED and r > now]) >= self.BUFFER:
+            raise GPhoto2Error(Gphoto.GP_ERROR_CAMERA_BUSY)
+        rig.clock.sleep(self.T_TRIGGER)
+        rig.captures = rig.captures + 1
+        if rig.captures == rig.ptp_at:
+            raise GPhoto2Error(Gphoto.GP_ERROR_IO)
+        rig.shots = rig.shots + 1
+        name = "DSC_%04d.JPG" % rig.shots
+        rig.card[name] = (rig.clock.t, list(rig.pos))
+        start = max(rig.cam_ready, now)
+        rig.cam_ready = start + self.T_CAPTURE
+        rig.exposures.append((start, start + self.T_EXPOSE, name))
+        rig.events.append((start + self.T_EXPOSE, Gphoto.GP_EVENT_CAPTURE_COMPLETE, name))
+        rig.events.append((rig.cam_ready, Gphoto.GP_EVENT_FILE_ADDED, name))
+
+    # no sleep, the watcher thread polls while the virtual clock runs on
+
+    def wait_for_event(self, timeout):
+        rig = self.rig
+        if rig.events and rig.events[0][0] <= rig.clock.t:
+            ready, kind, name = rig.events.pop(0)
+            if kind == Gphoto.GP_EVENT_CAPTURE_COMPLETE:
+                return kind, None
+            return kind, CameraFilePath("/store_00010001/DCIM/100NIKON", name)
+        return Gphoto.GP_EVENT_TIMEOUT, None
+
+    def file_get(self, folder, name, kind):
+        rig = self.rig
+        if threading.current_thread().name == "download":
+            rig.cam_busy = max(rig.cam_busy, rig.clock.t) + self.T_DOWNLOAD
+        else:
+            self.idle()
+            rig.clock.sleep(self.T_DOWNLOAD)
+        t, pos = rig.card[name]
+        data = b"\xff\xd8\xff\xe0" + ("sim %s t=%.3f pos=%s\n" % (name, t, pos)).encode("ascii")
+        return CameraFile(name, data)
+
+    T_CONFIG = 0.1
+
+    def get_config(self):
+        self.idle()
+        self.rig.clock.sleep(self.T_CONFIG)
+        config = CameraWidget("main")
+        config.children['capturetarget'] = CameraWidget("capturetarget", self.rig.target,
+                                                        ["Internal RAM", "Memory card"])
+        return config
+
+    def set_config(self, config):
+        self.rig.clock.sleep(self.T_CONFIG)
+        self.rig.target = config.get_child_by_name('capturetarget').get_value()
+
+    # live view: a checkerboard, blurred by the swing of the rig after the last move
+
+    T_PREVIEW = 0.05
+
+    def capture_preview(self):
+        rig = self.rig
+        self.idle()
+        rig.clock.sleep(self.T_PREVIEW)
+        r = int(round(rig.swing()))
+        img = ((np.indices((48, 48)).sum(axis=0) // 6) % 2 * 200 + 20).astype(np.float64)
+        if r > 0:
+            c = np.cumsum(np.pad(img, ((0, 0), (r + 1, r)), 'edge'), axis=1)
+            img = (c[:, 2 * r + 1:] - c[:, :-2 * r - 1]) / (2 * r + 1)
+        data = b"P5\n48 48\n255\n" + img.astype(np.uint8).tobytes()
+        return CameraFile("preview.pgm", data)
+
+    def get_summary(self):
+        self.idle()
+        self.rig.clock.sleep(self.T_SUMMARY)
+        return "sim camera"
+
+    def exit(self):
+        self.idle()
+        self.rig.clock.sleep(self.T_EXIT)
+
+class GPhoto2Error(Exception):
+
+    TEXT = {-7: "I/O problem", -110: "Camera busy"}
+
+    def __init__(self, code):
+        Exception.__init__(self, "[%d] %s" % (code, self.TEXT.get(code, "Unspecified error")))
+        self.code = code
+
+class Gphoto(object):
+
+    GP_CAPTURE_IMAGE = 0
+    GP_FILE_TYPE_NORMAL = 1
+    GP_ERROR_IO = -7
+    GP_ERROR_CAMERA_BUSY = -110
+    GP_EVENT_UNKNOWN = 0
+    GP_EVENT_TIMEOUT = 1
+    GP_EVENT_FILE_ADDED = 2
+    GP_EVENT_CAPTURE_COMPLETE = 4
+    GPhoto2Error = GPhoto2Error
+
+    def __init__(self, rig):
+        self.rig = rig
+
+    def Camera(self):
+        return Camera(self.rig)
+
+#-----------------------------------------------------------------------------
+# subprocess, nothing is executed
+
+class Subprocess(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def call(self, args):
+        self.calls.append(args)
+        print("[sim] " + " ".join(args))
+        return 0
+
+#-----------------------------------------------------------------------------
+# pulse backend: advances the clock and moves the axes by the direction pins
+
+class SimPulse(fotopulse.SimBackend):
+
+    def __init__(self, rig, cpins, dpins):
+        fotopulse.SimBackend.__init__(self)
+        self.rig = rig
+        self.axis = dict((pin, mot) for mot, pin in enumerate(cpins))
+        self.dpins = dpins
+
+    def send(self, wave):
+        rig = self.rig
+        fotopulse.SimBackend.send(self, wave)
+        rises = {}
+        for pin, edge, off in wave.events:
+            if edge != fotopulse.RISE or pin not in self.axis:
+                continue
+            mot = self.axis[pin]
+            if self.levels.get(self.dpins[mot]):
+                d = 1
+            else:
+                d = -1
+            rises[mot] = rises.get(mot, 0) + 1
+            rig.steps[mot] = rig.steps[mot] + 1
+            rig.pos[mot] = rig.pos[mot] + d
+            if mot == 0:
+                # der Schlitten bleibt am Anschlag stehen
+                rig.xpos = max(rig.xpos + d, -rig.overtravel)
+        rig.shake(rises, wave.length_us / 1000000.0)
+        rig.exposing(rises, wave.length_us / 1000000.0)
+        rig.clock.advance(wave.length_us / 1000000.0)
+        # die Wellen nicht ewig aufheben
+        self.waves = []
+        if rig.estop_at is not None and rig.clock.t >= rig.estop_at:
+            rig.estop_at = None
+            rig.estop("sim")
+
+#-----------------------------------------------------------------------------
+# the rig
+# xpos - MX carriage in steps left of the endstop (unknown to the script)
+# estop_at - virtual time of an emergency stop during a move (FOTO_SIM_ESTOP), estop - its trigger
+
+class Rig(object):
+
+    def __init__(self, xpos=15000, overtravel=40):
+        self.clock = Clock()
+        self.gpio = Gpio()
+        self.smbus = Expander(self)
+        self.gp = Gphoto(self)
+        self.subprocess = Subprocess()
+        self.xpos = xpos
+        self.overtravel = overtravel
+        self.steps = [0, 0, 0, 0]
+        self.pos = [0, 0, 0, 0]
+        self.shots = 0
+        self.captures = 0
+        self.cam_busy = 0.0
+        self.cam_ready = 0.0
+        self.stop_t = 0.0
+        self.peak = {}
+        self.events = []
+        self.exposures = []
+        self.shaken = set()
+        self.target = "Internal RAM"
+        self.card = {}
+        self.wall = _time.time()
+        # FOTO_SIM_ESTOP=<s>: Nothalt bei virtueller Zeit s, FOTO_SIM_PTP=<n>: n-te Ausloesung scheitert einmal
+        estop = os.environ.get('FOTO_SIM_ESTOP', '')
+        self.estop_at = float(estop) if estop else None
+        self.estop = None
+        ptp = os.environ.get('FOTO_SIM_PTP', '')
+        self.ptp_at = int(ptp) if ptp else None
+
+    # swing of the rig: amplitude in pixels of the preview from the highest speed of the
+    # last move of an axis relative to its vmax, dying out with TAU of that axis
+
+    SWING = 8.0
+    TAU = {0: 0.45, 1: 0.2, 2: 0.2, 3: 0.2}
+
+    def shake(self, rises, secs):
+        if not rises or secs <= 0:
+            return
+        if self.clock.t - self.stop_t > 0.1:
+            # neue Fahrt
+            self.peak = {}
+        for mot, n in rises.items():
+            self.peak[mot] = max(self.peak.get(mot, 0.0), n / secs)
+        self.stop_t = self.clock.t + secs
+
+    def swing(self):
+        dt = self.clock.t - self.stop_t
+        return max([self.SWING * min(1.0, v / fotoprofile.AXES[mot]['vmax']) * math.exp(-dt / self.TAU[mot])
+                    for mot, v in self.peak.items()] + [0.0])
+
+    # frames of event mode with steps during their exposure window
+
+    def exposing(self, rises, secs):
+        t = self.clock.t
+        self.exposures = [w for w in self.exposures if w[1] > t]
+        if rises:
+            for start, end, name in self.exposures:
+                if start < t + secs:
+                    self.shaken.add(name)
+
+    def backend(self, cpins, dpins):
+        self.pulse = SimPulse(self, cpins, dpins)
+        return self.pulse
+
+    # motion in its own process (FOTO_MOTION=proc): the steps were made on the rig copy
+    # there, this one follows with the steps per axis and the duration of every run
+
+    def mirror(self, steps, us):
+        self.clock.advance(us / 1000000.0)
+        if us > 0:
+            # mittlere statt hoechster Geschwindigkeit
+            self.peak = dict((mot, abs(d) * 1000000.0 / us) for mot, d in enumerate(steps) if d != 0)
+            self.stop_t = self.clock.t
+        for mot, d in enumerate(steps):
+            self.steps[mot] = self.steps[mot] + abs(d)
+            self.pos[mot] = self.pos[mot] + d
+        self.xpos = max(self.xpos + steps[0], -self.overtravel)
+
+    def report(self):
+        print("----------------------------------------------------------")
+        print("[sim] virtuelle Zeit  : %.2f s (davon Pausen %.2f s)" % (self.clock.t, self.clock.slept))
+        print("[sim] Rechenzeit      : %.3f s" % (_time.time() - self.wall))
+        print("[sim] Schritte        : MX %d, MY %d, MZ %d, MA %d" % tuple(self.steps))
+        print("[sim] Position netto  : MX %d, MY %d, MZ %d, MA %d" % tuple(self.pos))
+        print("[sim] MX vom Endstop  : %d" % self.xpos)
+        print("[sim] I2C-Lesezugriffe: %d" % self.smbus.reads)
+        print("[sim] Aufnahmen       : %d (Ziel %s), %d waehrend der Belichtung bewegt" %
+              (self.shots, self.target, len(self.shaken)))
+
+#-----------------------------------------------------------------------------
+# working directory of a sim run: FOTO_SIM=<dir>, FOTO_SIM=1 means a temp dir
+
+def workdir(value):
+    if value in ("1", "yes", "true"):
+        import tempfile
+        return tempfile.mkdtemp(prefix="fotosim")
+    if not os.path.isdir(value):
+        os.makedirs(value)
+    return value
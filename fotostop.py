@@ -0,0 +1,111 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : emergency stop, fotostop.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-27
+# Last modified : 2020-01-27
+#
+# One flag for all stop sources: GUI button/Escape, Ctrl-C or SIGUSR1,
+# a GPIO input (falling edge) and the simulator. The stepping loop looks
+# at it before every packet (at most PACKET_MS long), then ramps the axes
+# down along the planned path and raises Stopped. Trigger time, reaction
+# and standstill are measured per stop.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import time
+import signal
+import threading
+
+import fotoworker
+
+#-----------------------------------------------------------------------------
+# raised in the program after the axes stopped, handled like a cancel
+
+class Stopped(fotoworker.Cancelled):
+    pass
+
+#-----------------------------------------------------------------------------
+# the emergency stop
+# clock/sleep - time source and sleep (the virtual clock in a simulation)
+# notify - called on every trigger, e.g. Worker.cancel
+
+class EStop(object):
+
+    def __init__(self, clock=time.time, sleep=time.sleep, notify=None):
+        self.flag = threading.Event()
+        self.clock = clock
+        self.tsleep = sleep
+        self.notify = notify
+        self.active = False
+        self.source = None
+        self.t_req = None
+        self.last = None
+
+    def trigger(self, source):
+        if not self.flag.is_set():
+            self.source = source
+            self.t_req = self.clock()
+            self.flag.set()
+        if self.notify is not None:
+            self.notify()
+
+    def is_set(self):
+        return self.flag.is_set()
+
+    def clear(self):
+        self.flag.clear()
+        self.source = None
+        self.t_req = None
+
+    def check(self):
+        if self.flag.is_set():
+            raise Stopped()
+
+    # warten in Scheiben, ein Stopp bricht nach spaetestens 50 ms ab
+
+    def sleep(self, secs):
+        end = self.clock() + secs
+        while True:
+            self.check()
+            rest = end - self.clock()
+            if rest <= 0:
+                break
+            self.tsleep(min(rest, 0.05))
+
+    #-------------------------------------------------------------------------
+    # sources
+
+    def watch_gpio(self, gpio, pin):
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(pin, gpio.FALLING, callback=lambda channel: self.trigger("GPIO %d" % pin))
+
+    # while a program runs (active) the signal stops it, otherwise idle(signum, frame) is called
+
+    def watch_signal(self, signum, idle=None):
+        def handler(sig, frame):
+            if self.active:
+                self.trigger("Signal %d" % sig)
+            elif idle is not None:
+                idle(sig, frame)
+        signal.signal(signum, handler)
+
+    #-------------------------------------------------------------------------
+    # report of a stop
+    # decel_us / steps - length of the braking ramp, called after the axes stand still
+
+    def halted(self, decel_us, steps):
+        stop_ms = (self.clock() - self.t_req) * 1000.0
+        self.last = {'source': self.source, 'stop_ms': stop_ms, 'steps': steps,
+                     'decel_ms': decel_us / 1000.0, 'react_ms': max(stop_ms - decel_us / 1000.0, 0.0)}
+        return self.last
+
+def summary(st):
+    return "Not-Halt (%s): Reaktion %.1f ms, Bremsweg %d Schritte in %.1f ms, Stillstand nach %.1f ms" % \
+        (st['source'], st['react_ms'], st['steps'], st['decel_ms'], st['stop_ms'])
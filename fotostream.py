@@ -0,0 +1,221 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : streaming step generator, fotostream.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-30
+# Last modified : 2020-01-30
+#
+# A move is generated as a pipeline of chunks: profile (periods of the
+# steps k0 .. k1-1) to interpolator (DDA masks of the same ticks) to the
+# packets of the output backend. Both stages compute their chunk from
+# the tick index, nothing is carried over, so memory stays the same for
+# a few hundred steps and for hours of tracking.
+#
+#   python fotostream.py         RSS of a million-step move
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import numpy as np
+
+import fotoprofile
+import fotomotion
+
+# Ticks je Block der Pipeline
+CHUNK = 4096
+
+#-----------------------------------------------------------------------------
+# a run (fotoplan.Run with junction speeds) as a stream of chunks
+# bits - mask bit per axis, shape - trap or scurve
+# secs - video move of one segment: constant speed, exactly secs long (None = as fast as allowed)
+# cruise - ticks of the constant speed part of a video move (a, b), else None
+
+class StreamPlan(object):
+
+    def __init__(self, run, bits, shape="trap", chunk=CHUNK, secs=None):
+        self.bits = bits
+        self.shape = shape
+        self.chunk = chunk
+        self.segs = []
+        for (c, dirs, speed), (ve, vx) in zip(run.segs, run.ve):
+            vmax, amax, vstart = fotoprofile.limits_n(c, speed)
+            self.segs.append((c, max(c.values()), vmax, amax, ve, vx))
+        self.ticks = sum(seg[1] for seg in self.segs)
+        self.ramps = None
+        self.cruise = None
+        if secs is not None and len(self.segs) == 1:
+            c, lead, vmax, amax, ve, vx = self.segs[0]
+            self.ramps = fotoprofile.video_ramps(lead, secs, vmax, amax, ve, shape)
+            self.cruise = (len(self.ramps[0]), lead - len(self.ramps[1]))
+
+    # yields masks, periods of at most chunk ticks
+
+    def chunks(self):
+        for c, lead, vmax, amax, ve, vx in self.segs:
+            k0 = 0
+            while k0 < lead:
+                k1 = min(k0 + self.chunk, lead)
+                if self.ramps is None:
+                    periods = fotoprofile.profile_at(k0, k1, lead, vmax, amax, ve, self.shape, vx)
+                else:
+                    periods = fotoprofile.video_at(k0, k1, lead, self.ramps)
+                yield fotomotion.dda_at(c, self.bits, k0, k1), periods
+                k0 = k1
+
+    # the whole run at once (step plan cache, short moves)
+
+    def arrays(self):
+        masks = []
+        periods = []
+        for m, p in self.chunks():
+            masks.append(m)
+            periods.append(p)
+        if not masks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(masks), np.concatenate(periods)
+
+    # tick of the nth step (1 ..) of axis mot, None if the run has fewer
+
+    def step_tick(self, mot, nth):
+        off = 0
+        for c, lead, vmax, amax, ve, vx in self.segs:
+            n = c.get(mot, 0)
+            if 0 < nth <= n:
+                return off + fotomotion.step_tick(n, lead, nth)
+            nth = nth - n
+            off = off + lead
+        return None
+
+#-----------------------------------------------------------------------------
+# compiled masks and periods (e.g. from the step plan cache) with the same interface
+
+class ArrayPlan(object):
+
+    def __init__(self, masks, periods, bits, chunk=CHUNK, cruise=None, ramps=None):
+        self.masks = masks
+        self.periods = periods
+        self.bits = bits
+        self.chunk = chunk
+        self.cruise = cruise
+        self.ramps = ramps
+        self.ticks = len(masks)
+
+    def chunks(self):
+        for k0 in range(0, self.ticks, self.chunk):
+            yield self.masks[k0:k0 + self.chunk], self.periods[k0:k0 + self.chunk]
+
+    def step_tick(self, mot, nth):
+        xs = np.cumsum((self.masks & self.bits[mot]) != 0)
+        if len(xs) == 0 or nth > xs[-1]:
+            return None
+        return int(np.searchsorted(xs, nth))
+
+#-----------------------------------------------------------------------------
+# sequential reader, hands out packets across the chunks
+# last - period of the last tick taken (speed for a braking ramp)
+
+class Reader(object):
+
+    def __init__(self, plan):
+        self.it = plan.chunks()
+        self.masks = None
+        self.periods = None
+        self.cum = None
+        self.pos = 0
+        self.last = 0
+
+    # next packet: at most n ticks and max_us long, at least one tick (empty at the end)
+
+    def take(self, n, max_us=None):
+        if self.masks is None or self.pos >= len(self.masks):
+            try:
+                self.masks, self.periods = next(self.it)
+            except StopIteration:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            self.cum = np.cumsum(self.periods)
+            self.pos = 0
+        a = self.pos
+        b = min(a + n, len(self.masks))
+        if max_us is not None:
+            base = self.cum[a] - self.periods[a]
+            m = int(np.searchsorted(self.cum, base + max_us, 'right'))
+            b = min(b, max(m, a + 1))
+        self.pos = b
+        self.last = int(self.periods[b - 1])
+        return self.masks[a:b], self.periods[a:b]
+
+#-----------------------------------------------------------------------------
+# memory of a million-step move: python fotostream.py
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if __name__ == "__main__":
+    import os
+    import time
+    import tempfile
+    import fotopulse
+    import fotoplan
+    import fotomotor
+    import fotostop
+    import fototiming
+    import fotoendstop
+    import fotoposition
+
+    STEPS = 1000000
+
+    # Backend ohne Wellenspeicher, wie im Simulator
+    class Sink(fotopulse.SimBackend):
+        def send(self, wave):
+            fotopulse.SimBackend.send(self, wave)
+            self.waves = []
+
+    class Gpio(object):
+        def output(self, pin, level):
+            pass
+
+    run = fotoplan.Run(1)
+    run.add([(0, 1, STEPS), (1, 1, STEPS // 30)], {0: STEPS, 1: STEPS // 30}, {0: 1, 1: 1}, 1)
+    fotoplan.junctions(run)
+    bits = {0: 1 << 5, 1: 1 << 6}
+
+    base = rss_kb()
+    t = time.time()
+    masks, periods = StreamPlan(run, bits).arrays()
+    print("ganze Arrays   : %7d Ticks, +%6d kB RSS, %.2f s" % (len(masks), rss_kb() - base, time.time() - t))
+    del masks, periods
+
+    d = tempfile.mkdtemp(prefix="fotostream")
+    pulse = Sink()
+    pulse.log = fototiming.StepLog()
+    pulse.setup([5, 6, 13, 19])
+    motion = fotomotor.Motion(pulse, Gpio(), 12, [5, 6], [13, 19],
+                              fotoendstop.Endstop(fotoendstop.FakeExpander(), 0x20, 0x04, 16),
+                              fotoposition.Position(os.path.join(d, "pos.json")),
+                              pulse.log, fotostop.EStop(), packet_ms=250)
+    samples = []
+
+    def progress(done):
+        if not samples or done - samples[-1][0] >= STEPS // 10:
+            samples.append((done, rss_kb()))
+
+    base = rss_kb()
+    t = time.time()
+    motion.move([([(0, 1, STEPS), (1, 1, STEPS // 30)], 1)], 1, progress=progress)
+    print("Pipeline       : %7d Ticks in %.1f s (virtuell %.0f s)" %
+          (STEPS, time.time() - t, motion.last_us / 1000000.0))
+    for done, kb in samples:
+        print("  nach %7d Ticks: RSS %+6d kB" % (done, kb - base))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : step timing, fototiming.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-20
+# Last modified : 2020-01-20
+#
+# Per-pulse timestamps go into a preallocated NumPy ring buffer, nothing
+# is allocated per step. After a move the intervals are compared with the
+# commanded periods and written as one line per move to a log file.
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import json
+import time
+import numpy as np
+
+# Abweichung Ist- zu Soll-Intervall in Mikrosekunden, Grenzen des Histogramms
+BINS = [-1000000, -100, -20, -5, 5, 20, 100, 500, 2000, 1000000000]
+
+#-----------------------------------------------------------------------------
+# the step log
+# size - ring buffer length in steps, percentiles cover the last size steps of a move,
+# count, duration and max. gap cover the whole move
+
+class StepLog(object):
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.buf = np.zeros(size, dtype=np.int64)
+        self.n = 0
+        self.mark = 0
+        self.first = 0
+        self.last = 0
+        self.maxgap = 0
+        self.last_stats = None
+        # Soll-Perioden der gesendeten Schritte, gleicher Ring
+        self.pbuf = np.zeros(size, dtype=np.int64)
+        self.pn = 0
+        self.pmark = 0
+        self.psum = 0
+
+    # pro Schritt: Zeitstempel in Mikrosekunden, gleiche Zeit (mehrere Achsen) zaehlt einmal
+
+    def stamp(self, t_us):
+        if self.n > self.mark:
+            if t_us == self.last:
+                return
+            gap = t_us - self.last
+            if gap > self.maxgap:
+                self.maxgap = gap
+        else:
+            self.first = t_us
+        self.buf[self.n % self.size] = t_us
+        self.last = t_us
+        self.n = self.n + 1
+
+    def begin(self):
+        self.mark = self.n
+        self.maxgap = 0
+        self.pmark = self.pn
+        self.psum = 0
+
+    # commanded periods as they are sent, end() then needs no periods of the whole move
+
+    def plan(self, periods):
+        k = len(periods)
+        if k == 0:
+            return
+        self.psum = self.psum + int(np.sum(periods))
+        if k > self.size:
+            periods = periods[k - self.size:]
+        idx = np.arange(self.pn + k - len(periods), self.pn + k) % self.size
+        self.pbuf[idx] = periods
+        self.pn = self.pn + k
+
+    # statistics of the move since begin()
+    # periods - commanded step periods, for the jitter histogram (default: those given to plan())
+
+    def end(self, periods=None):
+        steps = self.n - self.mark
+        st = {'time': time.time(), 'steps': steps}
+        if steps < 2:
+            self.last_stats = st
+            return st
+        k = min(steps, self.size)
+        idx = np.arange(self.n - k, self.n) % self.size
+        iv = np.diff(self.buf[idx])
+        dur = self.last - self.first
+        st['duration_ms'] = dur / 1000.0
+        st['steps_s'] = (steps - 1) * 1000000.0 / dur if dur > 0 else 0.0
+        st['mean_us'] = float(iv.mean())
+        st['p50_us'] = float(np.percentile(iv, 50))
+        st['p95_us'] = float(np.percentile(iv, 95))
+        st['p99_us'] = float(np.percentile(iv, 99))
+        st['maxgap_us'] = int(self.maxgap)
+        if periods is not None and len(periods) >= steps:
+            # Intervall i liegt zwischen Schritt i und i+1, also Soll-Periode von Schritt i
+            want = np.asarray(periods[steps - k:steps - 1], dtype=np.int64)
+            st['want_steps_s'] = (steps - 1) * 1000000.0 / max(int(np.sum(periods[:steps - 1])), 1)
+            hist, edges = np.histogram(iv - want, BINS)
+            st['jitter_hist'] = hist.tolist()
+        elif periods is None and self.pn - self.pmark >= steps and self.pn - self.pmark - steps + k <= self.size:
+            p0 = self.pmark + steps - k
+            want = self.pbuf[np.arange(p0, p0 + k - 1) % self.size]
+            planned = self.pn - self.pmark
+            st['want_steps_s'] = (planned - 1) * 1000000.0 / \
+                max(self.psum - int(self.pbuf[(self.pn - 1) % self.size]), 1)
+            hist, edges = np.histogram(iv - want, BINS)
+            st['jitter_hist'] = hist.tolist()
+        self.last_stats = st
+        return st
+
+    # velocity ripple over the ticks a .. b-1 of the move since begin() (as far as still in the ring)
+    # window - steps per velocity sample, e.g. the steps of one video frame
+
+    def ripple(self, a, b, window):
+        steps = self.n - self.mark
+        a = max(a, steps - self.size)
+        b = min(b, steps)
+        window = max(int(window), 1)
+        if b - a < 2 * window + 1:
+            return None
+        t = self.buf[(self.mark + np.arange(a, b, window)) % self.size]
+        v = window * 1000000.0 / np.maximum(np.diff(t), 1)
+        mean = float(v.mean())
+        return {'v': mean, 'window': window, 'samples': len(v),
+                'pp_pct': 100.0 * float(v.max() - v.min()) / mean,
+                'rms_pct': 100.0 * float(v.std()) / mean}
+
+    def write(self, path, st):
+        with open(path, "a") as f:
+            f.write(json.dumps(st) + "\n")
+
+#-----------------------------------------------------------------------------
+# one line summary
+
+def summary(st):
+    if st['steps'] < 2:
+        return "%d Schritte" % st['steps']
+    s = "%d Schritte, %.0f Schritte/s" % (st['steps'], st['steps_s'])
+    if 'want_steps_s' in st:
+        s = s + " (Soll %.0f)" % st['want_steps_s']
+    s = s + ", p50 %.0f us, p99 %.0f us, max. Luecke %.1f ms" % (st['p50_us'], st['p99_us'], st['maxgap_us'] / 1000.0)
+    return s
+
+def video_summary(vd):
+    s = "Filmfahrt: Soll %.2f s, Ist %.3f s" % (vd['secs'], vd['real_s'])
+    if 'v' in vd:
+        s = s + ", Gleichlauf %.0f Schritte/s, Welligkeit p-p %.2f %%, rms %.2f %% (%d Fenster zu %d Schritten)" % \
+            (vd['v'], vd['pp_pct'], vd['rms_pct'], vd['samples'], vd['window'])
+    return s
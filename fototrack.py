@@ -0,0 +1,182 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : star tracking, fototrack.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-31
+# Last modified : 2020-01-31
+#
+# Slow pans at a fixed angular rate for hours, e.g. MY at the sidereal
+# rate (3200 1/16 steps per turn, one step every 26.9 s). Step k is due
+# at t0 + k/rate on the monotonic clock, never relative to the last step,
+# so nothing drifts. A late step (after a shot) is caught up at once.
+# Exposures go into the gaps between two steps when the measured shot
+# time fits, the field then only moves between exposures. The distance
+# to the ideal track is checked against a bound and logged.
+#
+#   python fototrack.py          one hour sidereal on a virtual clock
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import json
+import time
+
+# Sterntag in Sekunden, siderische Rate in Grad pro Sekunde
+SIDEREAL_DAY = 86164.0905
+SIDEREAL = 360.0 / SIDEREAL_DAY
+
+# Sicherheitsabstand einer Aufnahme zum naechsten Schritt, erste Schaetzung fuer das Herunterladen
+MARGIN = 0.5
+DOWNLOAD = 3.0
+
+# one log line every LOGEVERY seconds
+LOGEVERY = 60.0
+
+def rate_steps(deg_s, per_turn=3200):
+    return deg_s * per_turn / 360.0
+
+#-----------------------------------------------------------------------------
+# the tracker
+# step(n) - n steps on the tracking axis, rate - steps per second, secs - duration
+# expose() - one shot, exposure - its exposure time in seconds (None = no shots)
+# clock/sleep - monotonic clock, check() - cancel point (called at least every 50 ms)
+# bound - allowed lag behind the ideal track in steps, one step is the resolution, logpath - JSON lines
+
+class Tracker(object):
+
+    def __init__(self, step, rate, secs, expose=None, exposure=None, clock=None, sleep=time.sleep,
+                 check=None, bound=1.5, logpath=None):
+        if clock is None:
+            clock = getattr(time, 'monotonic', time.time)
+        self.step = step
+        self.rate = rate
+        self.secs = secs
+        self.expose = expose
+        self.exposure = exposure
+        self.clock = clock
+        self.sleep = sleep
+        self.check = check
+        self.bound = bound
+        self.logpath = logpath
+        self.numsteps = int(rate * secs)
+        self.done = 0
+        self.shots = 0
+        self.shot_s = None
+        self.shot_due = False
+        self.t0 = None
+        self.maxerr = 0.0
+        self.maxlate = 0.0
+        self.over = 0
+
+    # warten in Scheiben von 50 ms, check() bricht ab
+
+    def wait(self, t):
+        while True:
+            if self.check is not None:
+                self.check()
+            rest = t - self.clock()
+            if rest <= 0:
+                return
+            self.sleep(min(rest, 0.05))
+
+    def log(self, st):
+        if self.logpath is not None:
+            with open(self.logpath, "a") as f:
+                f.write(json.dumps(st) + "\n")
+
+    def stats(self, t):
+        return {'time': time.time(), 'track_s': round(t - self.t0, 3), 'steps': self.done,
+                'ideal': round(min(self.rate * (t - self.t0), self.numsteps), 3),
+                'maxerr_steps': round(self.maxerr, 3), 'maxlate_ms': round(self.maxlate * 1000.0, 1),
+                'over': self.over, 'shots': self.shots}
+
+    #-------------------------------------------------------------------------
+    # the tracking loop, returns the statistics of the run
+
+    def run(self):
+        self.t0 = self.clock()
+        tlog = self.t0
+        gap = 1.0 / self.rate if self.rate > 0 else self.secs
+        if self.exposure is not None:
+            self.shot_s = self.exposure + DOWNLOAD
+            if self.shot_s + MARGIN > gap:
+                print("Aufnahme (%.1f s) laenger als der Schrittabstand (%.1f s), Schritte werden nachgeholt." %
+                      (self.shot_s, gap))
+        while self.done < self.numsteps:
+            due = self.t0 + (self.done + 1) / self.rate
+            now = self.clock()
+
+            # Aufnahme, wenn sie in die Luecke passt (oder nie passt: dann gleich nach dem Schritt)
+            if self.expose is not None and self.exposure is not None and \
+               (due - now >= self.shot_s + MARGIN or (self.shot_s + MARGIN > gap and self.shot_due)):
+                t = self.clock()
+                self.expose()
+                self.shot_s = self.clock() - t
+                self.shots = self.shots + 1
+                self.shot_due = False
+                continue
+
+            self.wait(due)
+            # alle faelligen Schritte, nach einer langen Aufnahme mehrere
+            tb = self.clock()
+            err = self.rate * (tb - self.t0) - self.done
+            n = min(max(int((tb - self.t0) * self.rate) - self.done, 1), self.numsteps - self.done)
+            self.step(n)
+            t = self.clock()
+            self.done = self.done + n
+            self.shot_due = True
+
+            late = t - due
+            self.maxlate = max(self.maxlate, late)
+            self.maxerr = max(self.maxerr, err)
+            if err > self.bound:
+                self.over = self.over + 1
+            if t - tlog >= LOGEVERY or self.done >= self.numsteps:
+                self.log(self.stats(t))
+                tlog = t
+        # Rest der Dauer nach dem letzten Schritt
+        self.wait(self.t0 + self.secs)
+        st = self.stats(self.clock())
+        self.log(st)
+        return st
+
+def summary(st):
+    return "Nachfuehrung %.0f s: %d Schritte (Soll %.1f), max. Rueckstand %.2f Schritte, " \
+           "max. Verspaetung %.1f ms, %d ueber der Grenze, %d Aufnahmen" % \
+        (st['track_s'], st['steps'], st['ideal'], st['maxerr_steps'], st['maxlate_ms'], st['over'], st['shots'])
+
+#-----------------------------------------------------------------------------
+# one hour sidereal on MY with 20 s exposures, virtual clock: python fototrack.py
+
+if __name__ == "__main__":
+
+    class Clock(object):
+        def __init__(self):
+            self.t = 0.0
+
+        def time(self):
+            return self.t
+
+        def sleep(self, secs):
+            # jeder Wecker kommt bis zu 2 ms zu spaet
+            self.t = self.t + secs + 0.002
+
+    clock = Clock()
+    moved = []
+
+    def step(n):
+        clock.t = clock.t + 0.0005 * n
+        moved.append(n)
+
+    def expose():
+        clock.t = clock.t + 20.0 + 2.4
+
+    rate = rate_steps(SIDEREAL)
+    print("Siderisch: %.6f Grad/s, MY %.5f Schritte/s, ein Schritt alle %.2f s" % (SIDEREAL, rate, 1.0 / rate))
+    tr = Tracker(step, rate, 3600.0, expose, 20.0, clock.time, clock.sleep)
+    print(summary(tr.run()))
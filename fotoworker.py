@@ -0,0 +1,113 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : motion worker, fotoworker.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-01-18
+# Last modified : 2020-01-18
+#
+# Programs run one after another in a worker thread with a job queue.
+# GUI updates from the worker are queued and executed in the Tk thread
+# by pump(), called periodically via win.after. cancel() stops the
+# running job at its next check() and drops the queued ones.
+#
+#*****************************************************************************
+
+from __future__ import print_function
+
+import time
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+#-----------------------------------------------------------------------------
+# raised by check() inside a cancelled job
+
+class Cancelled(Exception):
+    pass
+
+#-----------------------------------------------------------------------------
+# the worker
+
+class Worker(object):
+
+    # oncancel(name) - called in the Tk thread after a cancelled job
+    # sleep - replacement for the waiting in sleep(), e.g. a virtual clock
+
+    def __init__(self, oncancel=None, sleep=None):
+        self.jobs = queue.Queue()
+        self.vsleep = sleep
+        self.events = queue.Queue()
+        self.stop = threading.Event()
+        self.oncancel = oncancel
+        self.busy = None
+        self.thread = threading.Thread(target=self.run, name="motion")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, name, func):
+        self.jobs.put((name, func))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def cancel(self):
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+        if self.busy is not None:
+            self.stop.set()
+
+    # im Job: Abbruch pruefen bzw. abbrechbar warten
+
+    def check(self):
+        if self.stop.is_set() and threading.current_thread() is self.thread:
+            raise Cancelled()
+
+    def sleep(self, secs):
+        if self.vsleep is not None:
+            self.vsleep(secs)
+            self.check()
+        elif threading.current_thread() is not self.thread:
+            time.sleep(secs)
+        elif self.stop.wait(secs):
+            raise Cancelled()
+
+    # GUI-Aufrufe aus dem Worker in den Tk-Thread verlagern
+
+    def call(self, func, *args):
+        if threading.current_thread() is self.thread:
+            self.events.put((func, args))
+        else:
+            func(*args)
+
+    def pump(self):
+        while True:
+            try:
+                func, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+
+    def run(self):
+        while True:
+            name, func = self.jobs.get()
+            self.busy = name
+            try:
+                func()
+            except Cancelled:
+                if self.oncancel is not None:
+                    self.call(self.oncancel, name)
+            except Exception:
+                traceback.print_exc()
+            self.busy = None
+            self.stop.clear()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python -*- coding: utf-8 -*-
+
+#*****************************************************************************
+#
+# This is the "foto slider" script for our motor driven camera slider.
+#
+# Module        : safety checks, tests/test_safety.py
+# Author        : Swen Hopfe (dj)
+# Design        : 2020-02-04
+# Last modified : 2020-02-04
+#
+# Endstop stop distance, emergency stop braking and the position file,
+# on the sim pulse backend and the fake PCF8574 (no hardware needed).
+#
+#   python -m pytest -q
+#
+#*****************************************************************************
+
+from __future__ import print_function, division
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fotoendstop
+import fotomotor
+import fotoposition
+import fotoprofile
+import fotopulse
+import fotostop
+import fototiming
+
+CPINS = [5, 6]
+DPINS = [13, 19]
+ESTEP = 16
+HOME = 400
+EMARGIN = 200
+
+#-----------------------------------------------------------------------------
+# Schiene: zaehlt die MX-Schritte, schliesst den Endstop bei trip_at,
+# loest den Not-Halt bei stop_at aus
+
+class Rail(fotopulse.SimBackend):
+
+    def __init__(self, expander, trip_at=None, stop_at=None):
+        fotopulse.SimBackend.__init__(self)
+        self.expander = expander
+        self.trip_at = trip_at
+        self.stop_at = stop_at
+        self.estop = None
+        self.mx = 0
+        self.tripped = None
+        self.stopped = None
+
+    def send(self, wave):
+        fotopulse.SimBackend.send(self, wave)
+        for pin, edge, off in wave.events:
+            if pin != CPINS[0] or edge != fotopulse.RISE:
+                continue
+            self.mx = self.mx + 1
+            if self.mx == self.trip_at:
+                self.tripped = self.mx
+                self.expander.set_input(0x04)
+            if self.mx == self.stop_at:
+                self.stopped = self.mx
+                self.estop.trigger("Test")
+
+class Gpio(object):
+
+    def output(self, pin, level):
+        pass
+
+def engine(tmpdir, trip_at=None, stop_at=None, interrupt=False):
+    fake = fotoendstop.FakeExpander()
+    rail = Rail(fake, trip_at, stop_at)
+    rail.log = fototiming.StepLog()
+    rail.setup(CPINS + DPINS)
+    if interrupt:
+        es = fotoendstop.Endstop(fake, 0x20, 0x04, ESTEP, 0, fake)
+    else:
+        es = fotoendstop.Endstop(fake, 0x20, 0x04, ESTEP)
+    estop = fotostop.EStop(lambda: rail.time_us / 1000000.0)
+    rail.estop = estop
+    pos = fotoposition.Position(str(tmpdir.join("foto.pos")))
+    motion = fotomotor.Motion(rail, Gpio(), 12, CPINS, DPINS, es, pos, rail.log, estop,
+                              home=HOME, emargin=EMARGIN, cstep=400)
+    return motion, rail
+
+#-----------------------------------------------------------------------------
+# Endstop: hoechstens ESTEP Schritte nach dem Schliessen
+
+@pytest.mark.parametrize("interrupt", [False, True])
+def test_guarded_stop_distance(interrupt):
+    for trip_at in (1, 7, 8, 9, 1000, 20000):
+        done, reads, over = fotoendstop.harness(27000, trip_at, ESTEP, interrupt)
+        assert done >= trip_at
+        assert over <= ESTEP
+
+def test_endstop_stale_position_file(tmpdir):
+    # Datei sagt: MX weit vom Endstop, der Schlitten wurde aber von Hand verschoben
+    with open(str(tmpdir.join("foto.pos")), "w") as f:
+        json.dump({'valid': True, 'pos': [20000, 0, 0, 0], 'known': [True] * 4, 'travel': [0] * 4}, f)
+    motion, rail = engine(tmpdir, trip_at=1000)
+    assert motion.position.known[0] and not motion.position.checked[0]
+    motion.move([([(0, 0, 20000)], 1)], 0)
+    assert motion.stopped
+    assert rail.mx - rail.tripped <= ESTEP
+    assert motion.position.pos[0] == -HOME
+
+def test_endstop_referenced_but_off(tmpdir):
+    # nach einer Nullung, die Position liegt trotzdem daneben: Pakete hoechstens EMARGIN
+    motion, rail = engine(tmpdir, trip_at=1000)
+    motion.position.reference(0, 20000)
+    motion.move([([(0, 0, 20000)], 1)], 0)
+    assert motion.stopped
+    assert rail.mx - rail.tripped <= EMARGIN
+
+#-----------------------------------------------------------------------------
+# Not-Halt: Bremsrampe bis vstart, Position bucht genau die gesendeten Schritte
+
+def test_estop_brakes_along_the_path(tmpdir):
+    motion, rail = engine(tmpdir, stop_at=3000)
+    with pytest.raises(fotostop.Stopped):
+        motion.move([([(0, 1, 20000)], 1)], 0)
+    vmax, amax, vstart = fotoprofile.limits_n({0: 20000})
+    ramp = len(fotoprofile.stop_profile(vmax, amax, vstart))
+    assert rail.stopped == 3000
+    assert 3000 < rail.mx < 20000
+    # ein Paket kann noch laufen, dann die Rampe
+    packet = int(vmax * motion.packet_ms / 1000.0) + 1
+    assert rail.mx - rail.stopped <= 2 * packet + ramp
+    assert motion.position.pos[0] == rail.mx
+    st = motion.estop.last
+    assert st['source'] == "Test"
+    assert st['steps'] <= ramp
+
+def test_estop_towards_endstop_within_stop_distance(tmpdir):
+    # ohne bekannte Freistrecke hoechstens ESTEP Bremsschritte Richtung Endstop
+    motion, rail = engine(tmpdir, stop_at=3000)
+    with pytest.raises(fotostop.Stopped):
+        motion.move([([(0, 0, 20000)], 1)], 0)
+    assert motion.estop.last['steps'] <= ESTEP
+    assert motion.position.pos[0] == -rail.mx
+
+#-----------------------------------------------------------------------------
+# Positionsdatei: ungueltig waehrend der Fahrt, nie halb geschrieben
+
+def test_position_file_invalid_during_move(tmpdir):
+    path = str(tmpdir.join("foto.pos"))
+    pos = fotoposition.Position(path)
+    pos.reference(0, 0)
+    pos.begin()
+    pos.moved(0, 500)
+    # Absturz mitten in der Fahrt: beim Neustart ist Nullung faellig
+    again = fotoposition.Position(path)
+    assert again.need_home(0)
+    pos.end()
+    again = fotoposition.Position(path)
+    assert not again.need_home(0)
+    assert again.pos[0] == 500
+    assert not again.checked[0]
+
+def test_position_file_atomic(tmpdir, monkeypatch):
+    path = str(tmpdir.join("foto.pos"))
+    pos = fotoposition.Position(path)
+    pos.reference(0, 123)
+    pos.end()
+    before = open(path).read()
+
+    def broken(data, f):
+        f.write('{"valid": true, "pos": [')
+        raise IOError("Strom weg")
+    monkeypatch.setattr(fotoposition.json, "dump", broken)
+    pos.moved(0, 1000)
+    with pytest.raises(IOError):
+        pos.end()
+    monkeypatch.undo()
+    assert open(path).read() == before
+    assert fotoposition.Position(path).pos[0] == 123